@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+SAIGE End-to-End Benchmark
+Runs the real saige_gui app against a local stub of llama-server's
+/v1/chat/completions (SSE at a configurable token rate) with a fake TTS engine
+and audio sink that record timing. Reports time to first token, time to first
+audio, gaps between sentences, throughput under N concurrent clients and
+audit-log overhead, and writes the results as JSON.
+
+    python benchmark_saige.py --rate 12 --clients 1,4,8 --output bench_results.json
+
+CPU-only: no model, Piper voice or sound card is needed. All files are written
+to a temporary directory.
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+REPLIES = [
+    "Sure, I can help with that. The robot arm uses three servos, and each one is driven by "
+    "a PWM signal at 50 Hz. Start by centering them at 1.5 ms before attaching the linkage.",
+    "Good question! Dr. Smith's team measured a 2.5% drift over 24 hours, e.g. from thermal "
+    "expansion. That is small, but it adds up... so recalibrate every morning.",
+    "The Jetson has 8 GB of shared memory. Phi-3 Mini at 4-bit needs about 2.3 GB, which "
+    "leaves room for Piper and the web server. Swap should stay off for stable latency.",
+    "Yes. I keep a signed log of every exchange, and you can check it at any time with the "
+    "verify endpoint. Each batch is sealed with one signature over the hash chain.",
+]
+
+
+def tokenize(text):
+    """Rough BPE-like split: words with their leading space, digits and punctuation alone"""
+    return re.findall(r" ?[A-Za-z']+| ?\d| ?[^\sA-Za-z\d]|\s+", text)
+
+
+# --- llama-server stub -------------------------------------------------------
+
+class LlamaStub:
+    """SSE /v1/chat/completions emulator: prefill delay, then tokens at `rate` per second.
+    `slots` streams decode at once (llama-server -np); the rest wait for a free slot."""
+
+    def __init__(self, rate, ttft, slots):
+        self.rate = rate
+        self.ttft = ttft
+        self.slot_gate = threading.Semaphore(slots)
+        self.requests = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with stub.lock:
+                    reply = REPLIES[stub.requests % len(REPLIES)]
+                    stub.requests += 1
+                tokens = tokenize(reply)[:body.get('max_tokens', 512)]
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                try:
+                    with stub.slot_gate:
+                        time.sleep(stub.ttft)
+                        for token in tokens:
+                            self._send('data: ' + json.dumps({'choices': [{'delta': {'content': token}}]}) + '\n\n')
+                            time.sleep(1.0 / stub.rate)
+                    self._send('data: [DONE]\n\n')
+                    self.wfile.write(b'0\r\n\r\n')
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # client cancelled; stop "decoding"
+
+            def do_GET(self):
+                # llama-server's /health, probed by the supervisor
+                body = b'{"status": "ok"}'
+                self.send_response(200 if self.path == '/health' else 404)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                self.close_connection = True  # probes are one-shot
+
+            def _send(self, text):
+                data = text.encode()
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+                self.wfile.flush()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1/chat/completions"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+# --- fake TTS ----------------------------------------------------------------
+
+class FakeEngine:
+    """Silence of speaking-rate length after a synthesis delay of base + per_char * len(text)"""
+
+    def __init__(self, base, per_char, chars_per_second):
+        self.sample_rate = 22050
+        self.cache_id = 'benchmark'
+        self.base = base
+        self.per_char = per_char
+        self.chars_per_second = chars_per_second
+
+    def synthesize(self, text):
+        time.sleep(self.base + self.per_char * len(text))
+        seconds = len(text) / self.chars_per_second
+        yield bytes(2 * int(self.sample_rate * seconds))
+
+
+class FakeAudioSink:
+    """Stands in for AudioOutputStream; records (turn, start, end) for every clip played"""
+
+    def __init__(self, worker, sample_rate):
+        self.worker = worker
+        self.sample_rate = sample_rate
+        self.realtime = True
+        self.clips = []
+        self._interrupted = threading.Event()
+
+    def write(self, pcm, should_stop=None):
+        owner = self.worker._playing_owner
+        start = time.monotonic()
+        duration = len(pcm) / (4 * self.sample_rate) if self.realtime else 0.0
+        written = len(pcm)
+        self._interrupted.clear()
+        while time.monotonic() - start < duration:
+            if self._interrupted.is_set() or (should_stop is not None and should_stop()):
+                written = int(len(pcm) * (time.monotonic() - start) / duration) & ~3
+                break
+            time.sleep(0.005)
+        self.clips.append((owner, start, time.monotonic()))
+        return written
+
+    def interrupt(self):
+        self._interrupted.set()
+
+    def close(self):
+        pass
+
+
+# --- measurement -------------------------------------------------------------
+
+def summarize(values):
+    values = sorted(values)
+    if not values:
+        return {'n': 0}
+    return {
+        'n': len(values),
+        'mean': round(statistics.fmean(values), 4),
+        'p50': round(values[len(values) // 2], 4),
+        'p95': round(values[min(len(values) - 1, int(len(values) * 0.95))], 4),
+        'max': round(values[-1], 4)
+    }
+
+
+def chat_once(base_url, client_id, message='Tell me something useful.', audio=False):
+    """POST /chat and read the SSE stream; returns client-side timings"""
+    import requests
+    sent = time.monotonic()
+    first_token = None
+    first_audio = None
+    frames = 0
+    audio_frames = 0
+    done = False
+    body = {'message': message, 'client_id': client_id, 'audio': audio}
+    with requests.post(f"{base_url}/chat", json=body, stream=True) as resp:
+        for line in resp.iter_lines():
+            if not line.startswith(b'data: '):
+                continue
+            payload = json.loads(line[6:])
+            if payload.get('content'):
+                frames += 1
+                if first_token is None:
+                    first_token = time.monotonic()
+            if payload.get('audio'):
+                audio_frames += 1
+                if first_audio is None:
+                    first_audio = time.monotonic()
+            if payload.get('done'):
+                done = True
+    end = time.monotonic()
+    return {
+        'ttft': (first_token - sent) if first_token else None,
+        'ttfa': (first_audio - sent) if first_audio else None,
+        'total': end - sent,
+        'frames': frames,
+        'audio_frames': audio_frames,
+        'done': done
+    }
+
+
+def histogram_state(histogram):
+    with histogram.lock:
+        return histogram.sum, histogram.count
+
+
+def histogram_mean_since(histogram, before):
+    total, count = histogram_state(histogram)
+    return round((total - before[0]) / (count - before[1]), 6) if count > before[1] else None
+
+
+def wait_for_speech(saige_gui):
+    saige_gui.tts_worker.tts_queue.join()
+    saige_gui.tts_worker.audio_queue.join()
+
+
+def run_latency(saige_gui, base_url, sink, requests_count):
+    """Sequential requests with real-time playback: TTFT, time to first audio, sentence gaps"""
+    sink.realtime = True
+    results = []
+    for i in range(requests_count):
+        sink.clips.clear()
+        timing = chat_once(base_url, 'latency')
+        wait_for_speech(saige_gui)
+        clips = [c for c in sink.clips if c[0] is not None]
+        if clips:
+            turn = clips[0][0]
+            timing['ttfa'] = clips[0][1] - turn.started_at
+            timing['gaps'] = [max(0.0, b[1] - a[2]) for a, b in zip(clips, clips[1:])]
+            timing['clips'] = len(clips)
+        results.append(timing)
+        print(f"  request {i + 1}: ttft {timing['ttft'] * 1000:.0f}ms, "
+              f"ttfa {timing.get('ttfa', float('nan')) * 1000:.0f}ms, clips {timing.get('clips', 0)}")
+    gaps = [g for r in results for g in r.get('gaps', [])]
+    return {
+        'ttft_seconds': summarize([r['ttft'] for r in results if r['ttft'] is not None]),
+        'ttfa_seconds': summarize([r['ttfa'] for r in results if 'ttfa' in r]),
+        'sentence_gap_seconds': summarize(gaps),
+        'audible_gaps_over_100ms': sum(1 for g in gaps if g > 0.1),
+        'stream_seconds': summarize([r['total'] for r in results])
+    }
+
+
+def run_concurrency(saige_gui, base_url, clients, requests_per_client):
+    """N clients each sending requests back to back; audio is not played in real time"""
+    results = []
+    lock = threading.Lock()
+
+    def client(k):
+        for _ in range(requests_per_client):
+            timing = chat_once(base_url, f"bench-{clients}-{k}")
+            with lock:
+                results.append(timing)
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=client, args=(k,)) for k in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.monotonic() - start
+    wait_for_speech(saige_gui)
+    return {
+        'clients': clients,
+        'requests': len(results),
+        'completed': sum(1 for r in results if r['done']),
+        'wall_seconds': round(wall, 3),
+        'requests_per_second': round(len(results) / wall, 3),
+        'frames_per_second': round(sum(r['frames'] for r in results) / wall, 1),
+        'ttft_seconds': summarize([r['ttft'] for r in results if r['ttft'] is not None]),
+        'stream_seconds': summarize([r['total'] for r in results])
+    }
+
+
+def run_streamed_audio(base_url, clients):
+    """N clients at once, each receiving its answer's audio in the stream instead of the speaker"""
+    results = []
+    lock = threading.Lock()
+
+    def client(k):
+        timing = chat_once(base_url, f"audio-{k}", audio=True)
+        with lock:
+            results.append(timing)
+
+    threads = [threading.Thread(target=client, args=(k,)) for k in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {
+        'clients': clients,
+        'completed': sum(1 for r in results if r['done']),
+        'audio_frames': summarize([r['audio_frames'] for r in results]),
+        'ttfa_seconds': summarize([r['ttfa'] for r in results if r['ttfa'] is not None]),
+        'stream_seconds': summarize([r['total'] for r in results])
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--rate', type=float, default=12.0, help='stub decode rate, tokens/s per stream')
+    parser.add_argument('--ttft', type=float, default=0.25, help='stub prefill delay before the first token (s)')
+    parser.add_argument('--slots', type=int, default=1, help='streams the stub decodes at once (llama-server -np)')
+    parser.add_argument('--requests', type=int, default=3, help='sequential requests in the latency run')
+    parser.add_argument('--clients', default='1,4,8', help='comma-separated client counts for the throughput runs')
+    parser.add_argument('--per-client', type=int, default=2, help='requests per client in each throughput run')
+    parser.add_argument('--synth-base', type=float, default=0.08, help='fake synthesis fixed cost (s)')
+    parser.add_argument('--synth-per-char', type=float, default=0.004, help='fake synthesis cost per character (s)')
+    parser.add_argument('--output', default='bench_results.json')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='saige-bench-')
+    stub = LlamaStub(args.rate, args.ttft, args.slots)
+    os.environ.update({
+        'SAIGE_LLAMA_API': stub.url,
+        'SAIGE_KEY_FILE': os.path.join(workdir, 'key.pem'),
+        'SAIGE_LOG_FILE': os.path.join(workdir, 'audit.json'),
+        'SAIGE_PIPER_MODEL': os.path.join(workdir, 'no-voice.onnx'),
+        'SAIGE_TTS_CACHE_DIR': os.path.join(workdir, 'tts-cache')
+    })
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+    import saige_gui
+    import audit_log
+    from tts_cache import TTSCache
+    from werkzeug.serving import make_server
+
+    # Real app and TTSWorker, fake voice and speaker; no caching so every run synthesizes
+    worker = saige_gui.tts_worker
+    engine = FakeEngine(args.synth_base, args.synth_per_char, saige_gui.TTS_CHARS_PER_SECOND)
+    worker.engine = engine
+    worker.cache = TTSCache(None, memory_bytes=0, disk_bytes=0)
+    sink = FakeAudioSink(worker, engine.sample_rate)
+    worker.audio_out = sink
+
+    server = make_server('127.0.0.1', 0, saige_gui.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    results = {
+        'revision': git_revision(),
+        'timestamp': time.time(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'config': vars(args)
+    }
+
+    print(f"Latency: {args.requests} sequential requests at {args.rate:g} tok/s, real-time playback")
+    results['latency'] = run_latency(saige_gui, base_url, sink, args.requests)
+
+    clients = max(int(c) for c in args.clients.split(',') if c.strip())
+    print(f"Streamed audio: {clients} clients receiving their own speech")
+    results['streamed_audio'] = run_streamed_audio(base_url, clients)
+    print(f"  ttfa p95 {results['streamed_audio']['ttfa_seconds'].get('p95')}s, "
+          f"{results['streamed_audio']['completed']}/{clients} completed")
+
+    # Throughput runs: synthesis and playback cost nothing so only the text path is measured
+    sink.realtime = False
+    engine.base = engine.per_char = 0.0
+    audit_before = {name: histogram_state(h) for name, h in (
+        ('sign', audit_log.SIGN_SECONDS), ('write', audit_log.WRITE_SECONDS),
+        ('commit_latency', audit_log.COMMIT_LATENCY), ('batch_entries', audit_log.BATCH_ENTRIES))}
+    results['throughput'] = []
+    for clients in [int(c) for c in args.clients.split(',') if c.strip()]:
+        print(f"Throughput: {clients} clients x {args.per_client} requests")
+        run = run_concurrency(saige_gui, base_url, clients, args.per_client)
+        print(f"  {run['requests_per_second']} req/s, ttft p95 {run['ttft_seconds'].get('p95')}s")
+        results['throughput'].append(run)
+
+    # Audit overhead: per-batch costs from the runs above, then the largest run without logging
+    saige_gui.audit_writer.flush(timeout=10)
+    results['audit'] = {
+        'sign_seconds_per_batch': histogram_mean_since(audit_log.SIGN_SECONDS, audit_before['sign']),
+        'write_seconds_per_batch': histogram_mean_since(audit_log.WRITE_SECONDS, audit_before['write']),
+        'commit_latency_seconds': histogram_mean_since(audit_log.COMMIT_LATENCY, audit_before['commit_latency']),
+        'entries_per_batch': histogram_mean_since(audit_log.BATCH_ENTRIES, audit_before['batch_entries'])
+    }
+    if results['throughput']:
+        clients = results['throughput'][-1]['clients']
+        logged = saige_gui.log_with_signature
+        saige_gui.log_with_signature = lambda message, response: None
+        try:
+            print(f"Audit overhead: {clients} clients with audit logging disabled")
+            unlogged = run_concurrency(saige_gui, base_url, clients, args.per_client)
+        finally:
+            saige_gui.log_with_signature = logged
+        with_audit = results['throughput'][-1]['requests_per_second']
+        results['audit']['requests_per_second_without_audit'] = unlogged['requests_per_second']
+        results['audit']['requests_per_second_with_audit'] = with_audit
+        results['audit']['throughput_cost_pct'] = round(
+            100 * (1 - with_audit / unlogged['requests_per_second']), 2) if unlogged['requests_per_second'] else None
+
+    server.shutdown()
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✅ Results written to {args.output}")
+    print(json.dumps({k: results[k] for k in ('latency', 'streamed_audio', 'audit')}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,44 +1,182 @@
 import gradio as gr
-from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
+from transformers import AutoModelForCausalLM, AutoTokenizer, StoppingCriteria, StoppingCriteriaList, TrainerCallback
+from transformers import (LogitsProcessorList, RepetitionPenaltyLogitsProcessor, TemperatureLogitsWarper,
+                          TopKLogitsWarper, TopPLogitsWarper)
 import torch
 import os
 import time  # Added for autonomous_loop sleep
 from ecdsa import SigningKey, SECP256k1, VerifyingKey  # For blockchain signing (from SelfEvolver)
 import hashlib
 import threading  # For optional autonomous background evolution
+import copy
+import itertools
+import json
+import queue
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Self-instruct generation: samples decoded together per batch (None = sized from free GPU memory)
+SELF_DATA_BATCH_SIZE = None
+SELF_DATA_MAX_BATCH = 16
+SELF_DATA_MAX_NEW_TOKENS = 200
+
+
+def fit_batch_size(model, seq_len, limit=SELF_DATA_MAX_BATCH, memory_fraction=0.5):
+    """Largest batch whose KV cache for seq_len tokens fits in part of the free GPU memory."""
+    if not torch.cuda.is_available():
+        return min(4, limit)
+    free, _ = torch.cuda.mem_get_info()
+    config = model.config
+    head_dim = config.hidden_size // config.num_attention_heads
+    kv_heads = getattr(config, "num_key_value_heads", None) or config.num_attention_heads
+    dtype_bytes = torch.finfo(model.dtype).bits // 8
+    # Keys and values for every layer, plus the same again for logits and activations
+    per_sample = 2 * 2 * config.num_hidden_layers * kv_heads * head_dim * dtype_bytes * seq_len
+    return max(1, min(limit, int(free * memory_fraction // per_sample)))
+
+
+def repeat_cache(cache, batch):
+    """Copy a batch-1 KV cache to `batch` rows so every sample continues the same prefill."""
+    if hasattr(cache, "batch_repeat_interleave"):
+        cache = copy.deepcopy(cache)
+        cache.batch_repeat_interleave(batch)
+        return cache
+    # Legacy tuple format: ((key, value), ...) per layer, batch first
+    return tuple(tuple(t.expand(batch, *t.shape[1:]).contiguous() for t in layer) for layer in cache)
+
+
+# Chat and evolution share one copy of the weights; each forward pass or training step
+# holds the lock, so chat keeps answering between training steps. Batched self-data
+# generation holds it across a whole generate() call, so it hands the lock to any
+# waiting chat step between decode steps instead (see YieldModelLock).
+class ModelLock:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = threading.Lock()
+        self._waiters = 0
+
+    def acquire(self):
+        with self._state:
+            self._waiters += 1
+        self._lock.acquire()
+        with self._state:
+            self._waiters -= 1
+
+    def release(self):
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def yield_to_waiters(self, timeout=0.05):
+        """Holder only: let a thread already waiting take the lock, then wait to get it back."""
+        if not self._waiters:
+            return
+        self._lock.release()
+        # threading.Lock is not fair; without this the holder would usually win it straight back
+        deadline = time.monotonic() + timeout
+        while self._waiters and time.monotonic() < deadline:
+            time.sleep(0.0005)
+        self.acquire()
+
+
+model_lock = ModelLock()
+
+
+class YieldModelLock(StoppingCriteria):
+    # generate() calls this after every decode step; it never stops generation
+    def __call__(self, input_ids, scores, **kwargs):
+        model_lock.yield_to_waiters()
+        return torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
 
 # Placeholder SelfEvolver class (extend as needed; integrates LoRA for self-evolution)
 class SelfEvolver:
-    def __init__(self, model_dir="models/phi3-mini-4k"):
-        self.model_dir = model_dir
-        self.model = AutoModelForCausalLM.from_pretrained(model_dir, trust_remote_code=True, device_map="auto")
-        self.tokenizer = AutoTokenizer.from_pretrained(model_dir, trust_remote_code=True)
+    def __init__(self, model, tokenizer):
+        # Wraps the already-loaded chat model; the LoRA adapter adds only a few MB on top
+        self.tokenizer = tokenizer
         # LoRA config for efficient tuning (requires pip install peft datasets)
         from peft import LoraConfig, get_peft_model, TaskType
         lora_config = LoraConfig(r=16, lora_alpha=32, target_modules=["qkv_proj"], task_type=TaskType.CAUSAL_LM)
-        self.model = get_peft_model(self.model, lora_config)
+        self.model = get_peft_model(model, lora_config)
         print("SelfEvolver initialized with LoRA adapter.")
 
-    def generate_self_data(self, task="generate uncensored self-naming responses", num_samples=50):
-        # Self-instruct: Generate synthetic data using current model
-        prompts = [f"Task: {task}. Create diverse, open-ended examples of AI responses."] * num_samples
-        dataset = []
-        for prompt in prompts:
-            inputs = self.tokenizer(prompt, return_tensors="pt")
-            outputs = self.model.generate(**inputs, max_new_tokens=200, temperature=1.0, do_sample=True)
-            response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-            dataset.append({"text": f"{prompt}\n{response}"})
+    @contextmanager
+    def base_weights(self):
+        # Chat answers with the base model, as before; call with model_lock held
+        with self.model.disable_adapter():
+            yield self.model
+
+    def generate_self_data(self, task="generate uncensored self-naming responses", num_samples=50, cancelled=None,
+                           batch_size=SELF_DATA_BATCH_SIZE, output_path=None):
+        # Self-instruct: Generate synthetic data using current model. Every sample has the
+        # same prompt, so it is tokenized and prefilled once and its KV cache is copied to
+        # each row of a batch; rows that hit EOS early are padded and the padding dropped.
+        prompt = f"Task: {task}. Create diverse, open-ended examples of AI responses."
+        output_path = output_path or f"./evolved_{task.replace(' ', '_')}/self_data.jsonl"
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        if self.tokenizer.pad_token_id is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        pad_id = self.tokenizer.pad_token_id
+
+        prompt_ids = self.tokenizer(prompt, return_tensors="pt").input_ids.to(self.model.device)
+        prompt_len = prompt_ids.shape[1]
+        if batch_size is None:
+            batch_size = fit_batch_size(self.model, prompt_len + SELF_DATA_MAX_NEW_TOKENS)
+        with model_lock, torch.no_grad():
+            # Everything but the last prompt token; generate() feeds that one and samples from it
+            prefix_cache = self.model(input_ids=prompt_ids[:, :-1], use_cache=True).past_key_values
+
+        written = 0
+        started = time.perf_counter()
+        # Samples go to disk as each batch finishes; the dataset is memory-mapped from there
+        with open(output_path, "w") as f:
+            while written < num_samples:
+                if cancelled is not None and cancelled.is_set():
+                    break
+                batch = min(batch_size, num_samples - written)
+                with model_lock, torch.no_grad():
+                    outputs = self.model.generate(
+                        input_ids=prompt_ids.expand(batch, -1),
+                        attention_mask=torch.ones((batch, prompt_len), dtype=torch.long, device=prompt_ids.device),
+                        past_key_values=repeat_cache(prefix_cache, batch),
+                        max_new_tokens=SELF_DATA_MAX_NEW_TOKENS, temperature=1.0, do_sample=True,
+                        pad_token_id=pad_id, stopping_criteria=StoppingCriteriaList([YieldModelLock()])
+                    )
+                for row in outputs[:, prompt_len:].tolist():
+                    if pad_id in row:
+                        row = row[:row.index(pad_id)]
+                    response = self.tokenizer.decode(row, skip_special_tokens=True)
+                    f.write(json.dumps({"text": f"{prompt}\n{response}"}) + "\n")
+                f.flush()
+                written += batch
+                elapsed = time.perf_counter() - started
+                print(f"Self-data: {written}/{num_samples} samples ({written / elapsed:.2f} samples/s, batch {batch_size})")
+        if not written:
+            return None
         from datasets import Dataset
-        return Dataset.from_list(dataset)
+        return Dataset.from_json(output_path)
 
-    def evolve_and_deploy(self, task="optimize for openness"):
+    def evolve_and_deploy(self, task="optimize for openness", job=None):
         print(f"Self-evolution triggered for: {task}")
+        job = job or EvolutionJob(task)
+        output_dir = f"./evolved_{task.replace(' ', '_')}"
         # Generate data
-        data = self.generate_self_data(task)
+        job.phase = 'generating data'
+        data = self.generate_self_data(task, cancelled=job.cancelled)
+        if job.cancelled.is_set():
+            return None
         # Fine-tune LoRA (simple 1-epoch; adjust for Jetson)
-        from transformers import Trainer, TrainingArguments
+        from transformers import Trainer, TrainingArguments, DataCollatorForLanguageModeling
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        data = data.map(lambda row: self.tokenizer(row["text"], truncation=True, max_length=512),
+                        remove_columns=data.column_names)
         training_args = TrainingArguments(
-            output_dir=f"./evolved_{task.replace(' ', '_')}",
+            output_dir=output_dir,
             num_train_epochs=1,
             per_device_train_batch_size=2,  # Low for Jetson RAM
             save_steps=50,
@@ -48,21 +186,287 @@ class SelfEvolver:
             model=self.model,
             args=training_args,
             train_dataset=data,
-            tokenizer=self.tokenizer
+            tokenizer=self.tokenizer,
+            data_collator=DataCollatorForLanguageModeling(self.tokenizer, mlm=False),
+            callbacks=[EvolutionProgress(job)]
         )
-        trainer.train()
+        job.phase = 'training'
+        try:
+            trainer.train()
+        finally:
+            self.model.eval()
+            if job.holds_lock:
+                # Training raised inside a step
+                job.holds_lock = False
+                model_lock.release()
+        if job.cancelled.is_set():
+            return None
         # Save/deploy adapter
-        self.model.save_pretrained(f"./evolved_{task.replace(' ', '_')}")
-        print(f"Evolved adapter saved for {task}. Reload in llama-server via --lora ./evolved_{task.replace(' ', '_')}")
+        job.phase = 'saving'
+        self.model.save_pretrained(output_dir)
+        print(f"Evolved adapter saved for {task}. Reload in llama-server via --lora {output_dir}")
+        return output_dir
+
+
+# One queued or running evolution; progress is read by the chat, cancel() stops it
+# between generation batches or training steps
+class EvolutionJob:
+    _ids = itertools.count(1)
+
+    def __init__(self, task):
+        self.id = next(self._ids)
+        self.task = task
+        self.phase = 'queued'
+        self.step = 0
+        self.max_steps = 0
+        self.output_dir = None
+        self.error = None
+        self.cancelled = threading.Event()
+        self.holds_lock = False
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def describe(self):
+        progress = f" {self.step}/{self.max_steps} steps" if self.phase == 'training' else ""
+        return f"#{self.id} '{self.task}': {self.phase}{progress}"
+
+
+# Gives chat the model between training steps, records progress and honours cancel
+class EvolutionProgress(TrainerCallback):
+    def __init__(self, job):
+        self.job = job
+
+    def on_step_begin(self, args, state, control, **kwargs):
+        if not self.job.holds_lock:
+            model_lock.acquire()
+            self.job.holds_lock = True
+
+    def on_step_end(self, args, state, control, **kwargs):
+        if self.job.holds_lock:
+            self.job.holds_lock = False
+            model_lock.release()
+        self.job.step, self.job.max_steps = state.global_step, state.max_steps
+        if self.job.cancelled.is_set():
+            control.should_training_stop = True
+
+
+# Runs evolutions one at a time on a background thread so generate_response returns at once
+class EvolutionQueue:
+    def __init__(self, evolver):
+        self.evolver = evolver
+        self.jobs = queue.Queue()
+        self.current = None
+        self.history = []
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, task):
+        job = EvolutionJob(task)
+        self.jobs.put(job)
+        return job
 
-# Load model (HF format; convert to GGUF for llama-server if needed)
+    def cancel(self):
+        """Cancel the running job and everything queued behind it."""
+        cancelled = [job for job in list(self.jobs.queue) + [self.current] if job is not None]
+        for job in cancelled:
+            job.cancel()
+        return cancelled
+
+    def status(self):
+        waiting = [job for job in list(self.jobs.queue) if not job.cancelled.is_set()]
+        lines = [f"Running {self.current.describe()}"] if self.current else ["No evolution running."]
+        lines += [f"Queued {job.describe()}" for job in waiting]
+        lines += [f"Finished {job.describe()}" for job in self.history[-3:]]
+        return "\n".join(lines)
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job.cancelled.is_set():
+                continue
+            self.current = job
+            try:
+                job.output_dir = self.evolver.evolve_and_deploy(job.task, job)
+                job.phase = 'cancelled' if job.cancelled.is_set() else f"done, adapter in {job.output_dir}"
+            except Exception as e:
+                job.error = e
+                job.phase = f"failed: {e}"
+                print(f"Self-evolution failed for {job.task}: {e}")
+            finally:
+                self.current = None
+                self.history.append(job)
+
+# Load model once (HF format; convert to GGUF for llama-server if needed); torch_dtype="auto"
+# keeps the checkpoint's 16-bit weights instead of upcasting them to float32
 model_dir = "models/phi3-mini-4k"
-model = AutoModelForCausalLM.from_pretrained(model_dir, trust_remote_code=True, device_map="auto")
+model = AutoModelForCausalLM.from_pretrained(model_dir, trust_remote_code=True, device_map="auto", torch_dtype="auto")
 tokenizer = AutoTokenizer.from_pretrained(model_dir, trust_remote_code=True)
-generator = pipeline("text-generation", model=model, tokenizer=tokenizer)
 
-# Initialize SelfEvolver for autonomy integration
-evolver = SelfEvolver(model_dir=model_dir)
+# Initialize SelfEvolver for autonomy integration; it adds LoRA to the same weights
+evolver = SelfEvolver(model, tokenizer)
+evolution = EvolutionQueue(evolver)
+
+# Chat generation: each Gradio session keeps its KV cache, so a turn only prefills its own text
+CHAT_MAX_NEW_TOKENS = 250
+CHAT_TEMPERATURE = 0.85
+CHAT_TOKEN_BUDGET = 3072  # tokens a session may hold (Phi-3 mini context is 4k)
+CHAT_SESSIONS_MAX = 2  # cached sessions; each costs up to CHAT_TOKEN_BUDGET tokens of keys/values
+STOP_TEXT = "\nUser:"
+
+
+def crop_cache(cache, length):
+    """Keep the first `length` positions of a KV cache."""
+    if hasattr(cache, "crop"):
+        cache.crop(length)
+        return cache
+    return tuple(tuple(t[:, :, :length] for t in layer) for layer in cache)
+
+
+def sampling_processors(config, temperature):
+    """The processors generate() applies when sampling with this generation config."""
+    processors = LogitsProcessorList()
+    if config.repetition_penalty is not None and config.repetition_penalty != 1.0:
+        processors.append(RepetitionPenaltyLogitsProcessor(config.repetition_penalty))
+    processors.append(TemperatureLogitsWarper(temperature))
+    if config.top_k:
+        processors.append(TopKLogitsWarper(config.top_k))
+    if config.top_p is not None and config.top_p < 1.0:
+        processors.append(TopPLogitsWarper(config.top_p))
+    return processors
+
+
+# Same sampling as the old pipeline call: the model's defaults (top_k=50, ...) at CHAT_TEMPERATURE
+chat_processors = sampling_processors(model.generation_config, CHAT_TEMPERATURE)
+
+
+def history_pairs(history):
+    """(user, assistant) pairs from Gradio history in either tuples or messages format."""
+    if history and isinstance(history[0], dict):
+        pairs, user = [], None
+        for m in history:
+            if m["role"] == "user":
+                user = m["content"]
+            elif m["role"] == "assistant" and user is not None:
+                pairs.append((user, m["content"]))
+                user = None
+        return pairs
+    return [(user, bot) for user, bot in history]
+
+
+# One conversation as the model saw it: the token ids of every turn, the KV cache over a
+# prefix of them, and the text Gradio shows, used to notice edits, retries and clears
+class ChatSession:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset([])
+
+    def reset(self, pairs):
+        self.ids = [tokenizer.bos_token_id] if tokenizer.bos_token_id is not None else []
+        self.turns = []  # (user, shown reply, index of the turn's first token)
+        self.dropped = []  # older (user, reply) pairs that no longer fit the token budget
+        self.cache = None
+        self.cached_len = 0
+        for user, bot in pairs:
+            self.add_turn(user, bot)
+
+    def add_turn(self, user, bot):
+        """Record a turn the model did not generate; it is prefilled with the next reply."""
+        start = len(self.ids)
+        self.ids += self.turn_ids(user) + tokenizer(" " + (bot or ""), add_special_tokens=False).input_ids
+        self.turns.append((user, bot, start))
+
+    def turn_ids(self, message):
+        separator = "\n" if self.turns else ""
+        return tokenizer(f"{separator}User: {message}\nAssistant:", add_special_tokens=False).input_ids
+
+    def matches(self, pairs):
+        return self.dropped + [(user, bot) for user, bot, _ in self.turns] == pairs
+
+    def fit(self, new_tokens):
+        """Drop the oldest turns once the budget is reached, keeping half of it.
+
+        The cache is rebuilt once then, instead of re-prefilling a sliding window every turn.
+        """
+        if len(self.ids) + new_tokens + CHAT_MAX_NEW_TOKENS <= CHAT_TOKEN_BUDGET:
+            return
+        head = 1 if tokenizer.bos_token_id is not None else 0
+        keep = len(self.turns)
+        keep_from = len(self.ids)
+        for k, (_, _, start) in enumerate(self.turns):
+            if len(self.ids) - start + new_tokens + CHAT_MAX_NEW_TOKENS <= CHAT_TOKEN_BUDGET // 2:
+                keep, keep_from = k, start
+                break
+        self.dropped += [(u, b) for u, b, _ in self.turns[:keep]]
+        self.turns = [(u, b, s - keep_from + head) for u, b, s in self.turns[keep:]]
+        self.ids = self.ids[:head] + self.ids[keep_from:]
+        self.cache = None
+        self.cached_len = 0
+
+
+chat_sessions = OrderedDict()
+chat_sessions_lock = threading.Lock()
+
+
+def chat_session(key):
+    with chat_sessions_lock:
+        session = chat_sessions.pop(key, None) or ChatSession()
+        chat_sessions[key] = session
+        while len(chat_sessions) > CHAT_SESSIONS_MAX:
+            chat_sessions.popitem(last=False)  # frees that session's KV cache
+        return session
+
+
+def hold_back_stop(text):
+    # Do not show the start of what may become "\nUser:" until it is clear it is not
+    for n in range(len(STOP_TEXT) - 1, 0, -1):
+        if text.endswith(STOP_TEXT[:n]):
+            return text[:-n]
+    return text
+
+
+def stream_reply(session, message):
+    """Append one user turn and yield the reply text as it grows; only uncached tokens are prefilled."""
+    piece = session.turn_ids(message)
+    session.fit(len(piece))
+    start = len(session.ids)
+    session.ids += piece
+    generated = []
+    eos = tokenizer.eos_token_id
+    try:
+        while len(generated) < CHAT_MAX_NEW_TOKENS:
+            # First step: the new turn plus anything left unfed last turn; then one token per step
+            feed = generated[-1:] if generated else session.ids[session.cached_len:]
+            with model_lock, torch.no_grad(), evolver.base_weights() as m:
+                out = m(input_ids=torch.tensor([feed], device=m.device), past_key_values=session.cache,
+                        use_cache=True)
+            session.cache = out.past_key_values
+            session.cached_len += len(feed)
+            seen = torch.tensor([session.ids + generated], device=out.logits.device)
+            scores = chat_processors(seen, out.logits[:, -1].float())
+            probs = torch.softmax(scores[0], dim=-1)
+            token = torch.multinomial(probs, 1).item()
+            if token == eos:
+                break
+            generated.append(token)
+            text = tokenizer.decode(generated, skip_special_tokens=True)
+            if STOP_TEXT in text:
+                break
+            yield hold_back_stop(text).strip()
+    finally:
+        # Also runs when the user stops the stream: keep the reply up to where the model
+        # began the next "User:" turn, and the cache no longer than the kept tokens
+        keep = len(generated)
+        cut = tokenizer.decode(generated, skip_special_tokens=True).find(STOP_TEXT)
+        while keep and cut >= 0 and len(tokenizer.decode(generated[:keep], skip_special_tokens=True)) > cut:
+            keep -= 1
+        session.ids += generated[:keep]
+        if session.cached_len > len(session.ids):
+            session.cache = crop_cache(session.cache, len(session.ids))
+            session.cached_len = len(session.ids)
+        reply = tokenizer.decode(generated[:keep], skip_special_tokens=True).strip()
+        session.turns.append((message, reply, start))
+    yield reply
+
 
 # Logging with persistent blockchain signature for tamper-proof audit (cybersecurity)
 BLOCKCHAIN_KEY_FILE = os.path.expanduser('~/.saige_signing_key.pem')
@@ -83,28 +487,48 @@ def log_message(message, response):
     with open("logs/chat_log.txt", "a") as f:
         f.write(f"{log_entry}Signature: {signature}\n---\n")
 
-def generate_response(message, history):
-    # Build prompt with history for context-aware self-thinking
-    prompt = ""
-    for user_msg, bot_msg in history:
-        prompt += f"User: {user_msg}\nAssistant: {bot_msg}\n"
-    prompt += f"User: {message}\nAssistant:"
-    # Generate response with unrestricted discourse
-    output = generator(prompt, max_new_tokens=250, do_sample=True, temperature=0.85, num_return_sequences=1)
-    response = output[0]['generated_text'].split("Assistant:")[-1].strip()
-    # Autonomy trigger: If "evolve" in message, initiate self-evolution
-    if "evolve" in message.lower():
-        task = message.replace("evolve", "").strip() or "optimize for robotic autonomy"
-        evolver.evolve_and_deploy(task)
-        response += "\n\nSelf-evolution triggered: New model generated, verified, and deployed. Check evolved_[task] dir for details."
+def evolution_command(message):
+    # Evolution controls answer straight away, without running the model
+    command = message.strip().lower()
+    if command in ("evolution status", "evolve status"):
+        return evolution.status()
+    if command in ("cancel evolution", "evolve cancel"):
+        cancelled = evolution.cancel()
+        return f"Cancelled {len(cancelled)} evolution job(s)." if cancelled else "No evolution to cancel."
+    return None
+
+def generate_response(message, history, request: gr.Request = None):
+    session = chat_session(request.session_hash if request is not None else None)
+    with session.lock:
+        # History edited, retried or cleared in the UI: rebuild this session's context from it
+        pairs = history_pairs(history)
+        if not session.matches(pairs):
+            session.reset(pairs)
+        reply = evolution_command(message)
+        if reply is not None:
+            session.add_turn(message, reply)
+            yield reply
+            return
+        # Generate response with unrestricted discourse, streamed token by token
+        response = ""
+        for response in stream_reply(session, message):
+            yield response
+        # Autonomy trigger: If "evolve" in message, queue self-evolution in the background
+        if "evolve" in message.lower():
+            task = message.replace("evolve", "").strip() or "optimize for robotic autonomy"
+            job = evolution.submit(task)
+            response += (f"\n\nSelf-evolution queued as job #{job.id}. Say 'evolution status' for progress "
+                         f"or 'cancel evolution' to stop it; the adapter lands in evolved_[task].")
+            # The note is shown (and comes back in history) but was never model output
+            session.turns[-1] = (message, response, session.turns[-1][2])
+            yield response
     # Log with signature
     log_message(message, response)
-    return response
 
 # Optional: Background thread for periodic autonomous evolution (headless mode for production)
 def autonomous_loop():
     while True:
-        evolver.evolve_and_deploy("enhance self-thinking capabilities")
+        evolution.submit("enhance self-thinking capabilities")
         time.sleep(3600)  # Evolve hourly; adjust for production
 
 # Uncomment for autonomous background ops: threading.Thread(target=autonomous_loop, daemon=True).start()
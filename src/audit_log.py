@@ -0,0 +1,505 @@
+import atexit
+import base64
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+from ecdsa import VerifyingKey
+
+from metrics import REGISTRY, SIZE_BUCKETS
+
+GENESIS = bytes(32)
+
+SIGN_SECONDS = REGISTRY.histogram('saige_audit_sign_seconds', 'ECDSA signing time per committed batch')
+WRITE_SECONDS = REGISTRY.histogram('saige_audit_write_seconds', 'Append plus fsync time per committed batch')
+COMMIT_LATENCY = REGISTRY.histogram('saige_audit_commit_latency_seconds', 'Time from submit until an entry is durable')
+BATCH_ENTRIES = REGISTRY.histogram('saige_audit_batch_entries', 'Entries per group commit', SIZE_BUCKETS)
+
+
+def entry_hash(message, response):
+    log_entry = f"User: {message}\nAssistant: {response}\n"
+    return hashlib.sha256(log_entry.encode()).digest()
+
+
+def chain_link(prev, digest):
+    return hashlib.sha256(prev + digest).digest()
+
+
+def b64(data):
+    return base64.b64encode(data).decode()
+
+
+def read_last_record(path, block_size=65536):
+    """Parse the final JSONL record of path without reading the whole file."""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        tail = b''
+        pos = end
+        while pos > 0:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            tail = f.read(step) + tail
+            lines = tail.rstrip(b'\n').split(b'\n')
+            if len(lines) > 1 or pos == 0:
+                try:
+                    return json.loads(lines[-1])
+                except ValueError:
+                    return None
+    return None
+
+
+def _record_chain(record, default):
+    return base64.b64decode(record['chain']) if record and 'chain' in record else default
+
+
+class _FlushMarker:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+# Background audit writer: entries are hash-chained, written in groups, and each
+# group is sealed by one ECDSA signature over the chain head plus a single fsync.
+class AuditWriter:
+    def __init__(self, log, signing_key, commit_window=0.25, batch_max=128, sign_each=False):
+        self.log = log
+        self.signing_key = signing_key
+        self.commit_window = commit_window
+        self.batch_max = batch_max
+        self.sign_each = sign_each
+        self._queue = queue.Queue()
+
+        self._chain = self._load_chain()
+
+        self.batches_written = 0
+        self.entries_written = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        # A clean exit writes whatever is still inside the commit window
+        atexit.register(self.flush, 5)
+
+    def _load_chain(self):
+        # Drop a torn last line, catch the index up, then resume from the chain head on disk
+        active = self.log.active_segment()
+        self.log.trim_torn_tail(active)
+        self.log.repair_index(active)
+        for n in reversed(self.log.segments()):
+            last = read_last_record(self.log.segment_path(n))
+            if last is not None:
+                return _record_chain(last, GENESIS)
+        return GENESIS
+
+    def submit(self, message, response):
+        """Queue an exchange for the next group commit; never blocks the caller."""
+        self._queue.put((time.time(), message, response))
+
+    def flush(self, timeout=None):
+        """Block until everything submitted so far is written and fsynced."""
+        marker = _FlushMarker()
+        self._queue.put(marker)
+        return marker.done.wait(timeout)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.commit_window
+            # Group commit: gather whatever arrives inside the durability window
+            while len(batch) < self.batch_max and not isinstance(batch[-1], _FlushMarker):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            entries = [item for item in batch if not isinstance(item, _FlushMarker)]
+            delay = 1.0
+            while entries:
+                try:
+                    self._commit(entries)
+                    break
+                except Exception as e:
+                    # Keep the batch; later entries wait behind it so the chain stays in order
+                    print(f"[AUDIT] Write failed for {len(entries)} entries, retrying in {delay:.0f}s: {e}")
+                    time.sleep(delay)
+                    delay = min(delay * 2, 30.0)
+                    try:
+                        self._chain = self._load_chain()
+                    except Exception as reload_error:
+                        print(f"[AUDIT] Could not re-read chain head: {reload_error}")
+            for item in batch:
+                if isinstance(item, _FlushMarker):
+                    item.done.set()
+
+    def _commit(self, entries):
+        chain = self._chain
+        lines = []
+        sign_seconds = 0.0
+        for timestamp, message, response in entries:
+            digest = entry_hash(message, response)
+            chain = chain_link(chain, digest)
+            record = {
+                'timestamp': timestamp,
+                'message': message,
+                'response': response,
+                'hash': b64(digest),
+                'chain': b64(chain)
+            }
+            if self.sign_each:
+                start = time.perf_counter()
+                record['signature'] = b64(self.signing_key.sign(digest))
+                sign_seconds += time.perf_counter() - start
+            lines.append((json.dumps(record), timestamp))
+
+        # One signature covers the whole group: the chain head commits to every entry before it
+        start = time.perf_counter()
+        seal_signature = b64(self.signing_key.sign(chain))
+        SIGN_SECONDS.observe(sign_seconds + time.perf_counter() - start)
+        lines.append((json.dumps({
+            'type': 'seal',
+            'timestamp': time.time(),
+            'count': len(entries),
+            'chain': b64(chain),
+            'signature': seal_signature
+        }), None))
+
+        with WRITE_SECONDS.time():
+            self.log.append(lines)
+        now = time.time()
+        for timestamp, _, _ in entries:
+            COMMIT_LATENCY.observe(now - timestamp)
+        BATCH_ENTRIES.observe(len(entries))
+
+        self._chain = chain
+        self.batches_written += 1
+        self.entries_written += len(entries)
+
+
+def signature_ok(verifying_key, signature, data):
+    try:
+        return verifying_key.verify(signature, data)
+    except Exception:
+        return False
+
+
+# Resumable verification state over audit records in file order. Legacy entries
+# carry their own signature. Chained entries are verified when every link up to a
+# seal matches and the seal's signature over the chain head is valid; entries
+# after the last seal are pending, not failed.
+class ChainVerifier:
+    def __init__(self, verifying_key, prev=GENESIS, total=0, verified=0, first_failure=None):
+        self.verifying_key = verifying_key
+        self.prev = prev
+        self.total = total
+        self.verified = verified
+        self.first_failure = first_failure
+        self._batch_start = None
+        self._batch_count = 0
+        self._batch_bad = False
+
+    def _fail(self, index):
+        if self.first_failure is None or index < self.first_failure:
+            self.first_failure = index
+
+    def _add_to_batch(self, index, ok):
+        if self._batch_count == 0:
+            self._batch_start = index
+        self._batch_count += 1
+        if not ok:
+            # A bad hash or broken link fails the entry whether or not a seal follows
+            self._batch_bad = True
+            self._fail(index)
+
+    def feed(self, line):
+        """Consume one JSONL line; returns True if it was a seal (a safe checkpoint)."""
+        if not line.strip():
+            return False
+        index = self.total
+        try:
+            record = json.loads(line)
+            if record.get('type') == 'seal':
+                head = base64.b64decode(record['chain'])
+                sealed = (not self._batch_bad and head == self.prev
+                          and signature_ok(self.verifying_key, base64.b64decode(record['signature']), head))
+                if sealed:
+                    self.verified += self._batch_count
+                elif self._batch_count and not self._batch_bad:
+                    self._fail(self._batch_start)
+                self._batch_count = 0
+                self._batch_bad = False
+                return True
+
+            self.total += 1
+            digest = entry_hash(record['message'], record['response'])
+            hash_ok = digest == base64.b64decode(record['hash'])
+            if 'chain' in record:
+                stored = base64.b64decode(record['chain'])
+                self._add_to_batch(index, hash_ok and chain_link(self.prev, digest) == stored)
+                self.prev = stored
+            elif hash_ok and signature_ok(self.verifying_key, base64.b64decode(record['signature']), digest):
+                self.verified += 1
+            else:
+                self._fail(index)
+        except Exception:
+            if self.total == index:
+                self.total += 1
+            self._add_to_batch(index, False)
+        return False
+
+
+def verify_lines(lines, verifying_key):
+    """Return (total_entries, verified_entries) for an iterable of JSONL audit records."""
+    verifier = ChainVerifier(verifying_key)
+    for line in lines:
+        verifier.feed(line)
+    return verifier.total, verifier.verified
+
+
+def _verify_range(args):
+    # Worker process: ranges start after a seal (or in the legacy prefix),
+    # so no batch spans two workers
+    path, start, end, prev, verifying_key_pem = args
+    verifier = ChainVerifier(VerifyingKey.from_pem(verifying_key_pem), prev)
+    with open(path, 'rb') as f:
+        f.seek(start)
+        pos = start
+        while pos < end:
+            line = f.readline()
+            if not line:
+                break
+            pos += len(line)
+            verifier.feed(line)
+    return verifier.total, verifier.verified, verifier.first_failure
+
+
+def _map_verify_ranges(ranges, workers):
+    # Workers are fresh interpreters running this file, which imports no server code.
+    # Forking would copy the server's live threads and the locks they hold, and
+    # multiprocessing's spawn/forkserver children re-import __main__ (the server).
+    groups = [ranges[i::workers] for i in range(min(workers, len(ranges)))]
+    procs = []
+    for group in groups:
+        proc = subprocess.Popen([sys.executable, os.path.abspath(__file__)], stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        pickle.dump(group, proc.stdin)
+        proc.stdin.flush()
+        procs.append(proc)
+    results = [None] * len(ranges)
+    for i, proc in enumerate(procs):
+        out, err = proc.communicate()
+        if proc.returncode != 0:
+            raise RuntimeError(f"audit verify worker failed: {err.decode(errors='replace').strip()}")
+        results[i::len(procs)] = pickle.loads(out)
+    return results
+
+
+def _chain_before(mm, offset):
+    # Chain value carried by the record that ends at offset (GENESIS for legacy records)
+    if offset == 0:
+        return GENESIS
+    line_start = mm.rfind(b'\n', 0, offset - 1) + 1
+    try:
+        record = json.loads(mm[line_start:offset])
+        return base64.b64decode(record['chain']) if 'chain' in record else GENESIS
+    except (ValueError, KeyError):
+        # Corrupt record: the range's first link will fail and be reported
+        return GENESIS
+
+
+def _line_ending_at(path, offset):
+    with open(path, 'rb') as f:
+        start = max(0, offset - 4096)
+        f.seek(start)
+        block = f.read(offset - start)
+    return block[block.rfind(b'\n', 0, len(block) - 1) + 1:]
+
+
+# /verify backend: incremental from a signed checkpoint, or a full re-verify split
+# across worker processes. The checkpoint only ever sits right after a seal.
+class LogVerifier:
+    def __init__(self, log, signing_key, checkpoint_path, workers=None, parallel_min_bytes=4 << 20):
+        self.log = log
+        self.signing_key = signing_key
+        self.verifying_key = signing_key.verifying_key
+        self.checkpoint_path = checkpoint_path
+        self.workers = workers or os.cpu_count() or 1
+        self.parallel_min_bytes = parallel_min_bytes
+        self.lock = threading.Lock()
+
+    def _checkpoint_digest(self, fields):
+        return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).digest()
+
+    def load_checkpoint(self):
+        """Return the checkpoint if its signature is valid and the log still matches it."""
+        try:
+            with open(self.checkpoint_path, 'r') as f:
+                checkpoint = json.load(f)
+            fields = checkpoint['fields']
+            if not signature_ok(self.verifying_key, base64.b64decode(checkpoint['signature']),
+                                self._checkpoint_digest(fields)):
+                return None
+            path = self.log.segment_path(fields['segment'])
+            if fields['offset'] > os.path.getsize(path):
+                return None
+            # Detect a rewritten or truncated log: the line ending at offset must be unchanged
+            if b64(hashlib.sha256(_line_ending_at(path, fields['offset'])).digest()) != fields['line_digest']:
+                return None
+            return fields
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save_checkpoint(self, segment, offset, chain, total, verified, first_failure):
+        last_line = _line_ending_at(self.log.segment_path(segment), offset)
+        fields = {
+            'segment': segment,
+            'offset': offset,
+            'chain': b64(chain),
+            'total': total,
+            'verified': verified,
+            'first_failure': first_failure,
+            'line_digest': b64(hashlib.sha256(last_line).digest())
+        }
+        checkpoint = {'fields': fields, 'signature': b64(self.signing_key.sign(self._checkpoint_digest(fields)))}
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def verify(self, full=False):
+        with self.lock:
+            started = time.monotonic()
+            checkpoint = None if full else self.load_checkpoint()
+            total_bytes = sum(os.path.getsize(self.log.segment_path(n)) for n in self.log.segments())
+            if checkpoint is not None:
+                result = self._verify_incremental(checkpoint)
+                mode = 'incremental'
+            elif total_bytes >= self.parallel_min_bytes and self.workers > 1:
+                result = self._verify_parallel()
+                mode = 'full-parallel'
+            else:
+                result = self._verify_incremental(None)
+                mode = 'full'
+            elapsed = time.monotonic() - started
+            total, verified, first_failure, checked = result
+            return {
+                'total_entries': total,
+                'verified_entries': verified,
+                'integrity': f"{verified}/{total} verified",
+                'first_failed_entry': first_failure,
+                'mode': mode,
+                'checked_entries': checked,
+                'seconds': round(elapsed, 3),
+                'entries_per_second': round(checked / elapsed, 1) if elapsed > 0 else None
+            }
+
+    def _verify_incremental(self, checkpoint):
+        if checkpoint is None:
+            first_segment, offset, verifier = 0, 0, ChainVerifier(self.verifying_key)
+        else:
+            first_segment, offset = checkpoint['segment'], checkpoint['offset']
+            verifier = ChainVerifier(self.verifying_key, base64.b64decode(checkpoint['chain']),
+                                     checkpoint['total'], checkpoint['verified'], checkpoint['first_failure'])
+        base_total = verifier.total
+        sealed_at = None
+        for n in self.log.segments():
+            if n < first_segment:
+                continue
+            start = offset if n == first_segment else 0
+            with open(self.log.segment_path(n), 'rb') as f:
+                f.seek(start)
+                pos = start
+                for line in f:
+                    pos += len(line)
+                    if verifier.feed(line):
+                        sealed_at = (n, pos, verifier.prev, verifier.total, verifier.verified, verifier.first_failure)
+        if sealed_at is not None:
+            self.save_checkpoint(*sealed_at)
+        return verifier.total, verifier.verified, verifier.first_failure, verifier.total - base_total
+
+    def _split_points(self, mm):
+        size = len(mm)
+        # Raw `"` inside message text is always escaped, so these byte patterns only match keys
+        first_chain = mm.find(b', "chain": "')
+        legacy_end = size if first_chain < 0 else mm.rfind(b'\n', 0, first_chain) + 1
+        seal_ends = []
+        pos = mm.find(b'\n{"type": "seal"')
+        while pos >= 0:
+            end = mm.find(b'\n', pos + 1)
+            end = size if end < 0 else end + 1
+            seal_ends.append(end)
+            pos = mm.find(b'\n{"type": "seal"', end - 1)
+
+        sealed_end = seal_ends[-1] if seal_ends else legacy_end
+        cuts = {0, legacy_end, sealed_end}
+        step = max(1, sealed_end // (self.workers * 4))
+        for target in range(step, sealed_end, step):
+            if target < legacy_end:
+                # Legacy entries stand alone, so any line boundary will do
+                cut = mm.find(b'\n', target)
+                cuts.add(legacy_end if cut < 0 else min(cut + 1, legacy_end))
+            else:
+                # Chained entries: only cut right after a seal
+                i = bisect.bisect_left(seal_ends, target)
+                if i < len(seal_ends):
+                    cuts.add(seal_ends[i])
+        return sorted(c for c in cuts if c <= sealed_end), sealed_end
+
+    def _verify_parallel(self):
+        pem = self.verifying_key.to_pem()
+        ranges = []
+        carry = GENESIS
+        segments = [n for n in self.log.segments() if os.path.getsize(self.log.segment_path(n)) > 0]
+        last_segment, sealed_end, head_chain = 0, 0, GENESIS
+        for n in segments:
+            path = self.log.segment_path(n)
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                cuts, sealed_end = self._split_points(mm)
+                if n != segments[-1]:
+                    # Rotation happens after a seal, so this is normally a no-op
+                    cuts.append(len(mm))
+                    sealed_end = len(mm)
+                for start, end in zip(cuts, cuts[1:]):
+                    if end > start:
+                        prev = carry if start == 0 else _chain_before(mm, start)
+                        ranges.append((path, start, end, prev, pem))
+                head_chain = carry if sealed_end == 0 else _chain_before(mm, sealed_end)
+                carry = _record_chain(read_last_record(path), carry)
+                last_segment = n
+
+        results = _map_verify_ranges(ranges, self.workers)
+
+        total = verified = 0
+        first_failure = None
+        for count, ok, failure in results:
+            if failure is not None and first_failure is None:
+                first_failure = total + failure
+            total += count
+            verified += ok
+        if segments:
+            self.save_checkpoint(last_segment, sealed_end, head_chain, total, verified, first_failure)
+
+        # Unsealed tail (still inside the commit window when we started) is checked in-process
+        verifier = ChainVerifier(self.verifying_key, head_chain, total, verified, first_failure)
+        if segments:
+            with open(self.log.segment_path(last_segment), 'rb') as f:
+                f.seek(sealed_end)
+                for line in f:
+                    verifier.feed(line)
+        return verifier.total, verifier.verified, verifier.first_failure, verifier.total
+
+
+if __name__ == '__main__':
+    # Verification worker for _map_verify_ranges: pickled ranges in, one result per range out
+    pickle.dump([_verify_range(args) for args in pickle.load(sys.stdin.buffer)], sys.stdout.buffer)
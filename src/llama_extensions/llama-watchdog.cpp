@@ -1,27 +1,183 @@
 #include <iostream>
+#include <fstream>
+#include <string>
+#include <vector>
+#include <algorithm>
+#include <cerrno>
+#include <csignal>
+#include <cstring>
+#include <ctime>
 #include <unistd.h>
+#include <fcntl.h>
 #include <sys/wait.h>
-#include <string>
+#include <sys/stat.h>
+#include <sys/socket.h>
+#include <sys/time.h>
+#include <netinet/in.h>
+#include <arpa/inet.h>
+
+// Runs llama-server, probes its /health endpoint and restarts it when it exits or stops
+// answering. Restarts back off exponentially (1s doubling to 60s) and the backoff resets
+// once the server has stayed healthy for a minute. The model file is read through the
+// page cache before every start so a restart does not reload it from disk.
+// The server's pid is written to PID_FILE; saige_gui's supervisor uses it to kill a
+// server whose streams stall, and this loop then brings it back.
+// Build: g++ -O2 -o llama-watchdog llama-watchdog.cpp
+
+static const char *HOME_MODEL = "/SAIGE/models/Phi-3-mini-4k-instruct-q4.gguf";
+static const char *PID_FILE = "/run/saige/llama-server.pid";
+static const int PORT = 8080;
+static const int PROBE_INTERVAL_S = 2;
+static const int PROBE_TIMEOUT_S = 3;
+static const int FAILURES_TO_RESTART = 3;
+static const int STARTUP_GRACE_S = 180;  // model load time before failed probes count
+static const int BACKOFF_INITIAL_S = 1;
+static const int BACKOFF_MAX_S = 60;
+
+static volatile sig_atomic_t server_pid = 0;
+
+static std::string home() {
+    const char *h = getenv("HOME");
+    return h ? h : "";
+}
+
+static std::string server_cmd() {
+    return "exec " + home() + "/llama.cpp/build/bin/llama-server -m " + home() + HOME_MODEL +
+           " -ngl 99 --host 0.0.0.0 --port " + std::to_string(PORT) +
+           " -c 4096 --log-file /var/log/saige_inference.log";
+}
+
+// Pull the model into the page cache; cheap when it is already resident
+static void warm_page_cache(const std::string &path) {
+    int fd = open(path.c_str(), O_RDONLY);
+    if (fd < 0) return;
+    posix_fadvise(fd, 0, 0, POSIX_FADV_WILLNEED);
+    std::vector<char> buffer(8 << 20);
+    while (read(fd, buffer.data(), buffer.size()) > 0) {}
+    close(fd);
+}
+
+// GET /health; true only for a 200 within the timeout (503 while the model loads)
+static bool probe_health() {
+    int sock = socket(AF_INET, SOCK_STREAM, 0);
+    if (sock < 0) return false;
+    timeval tv{PROBE_TIMEOUT_S, 0};
+    setsockopt(sock, SOL_SOCKET, SO_RCVTIMEO, &tv, sizeof(tv));
+    setsockopt(sock, SOL_SOCKET, SO_SNDTIMEO, &tv, sizeof(tv));
+    sockaddr_in addr{};
+    addr.sin_family = AF_INET;
+    addr.sin_port = htons(PORT);
+    inet_pton(AF_INET, "127.0.0.1", &addr.sin_addr);
+
+    bool ok = false;
+    if (connect(sock, (sockaddr *)&addr, sizeof(addr)) == 0) {
+        const char *req = "GET /health HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n";
+        char reply[64] = {0};
+        if (send(sock, req, strlen(req), MSG_NOSIGNAL) > 0 && recv(sock, reply, sizeof(reply) - 1, 0) > 12) {
+            ok = strncmp(reply + 9, "200", 3) == 0;  // "HTTP/1.1 200 OK"
+        }
+    }
+    close(sock);
+    return ok;
+}
+
+static void write_pid(pid_t pid) {
+    mkdir("/run/saige", 0755);
+    std::ofstream(PID_FILE) << pid << std::endl;
+}
+
+// SIGTERM, then SIGKILL if a hung server ignores it
+static int stop_server(pid_t pid) {
+    int status = 0;
+    kill(pid, SIGTERM);
+    for (int i = 0; i < 50; i++) {
+        if (waitpid(pid, &status, WNOHANG) == pid) return status;
+        usleep(100000);
+    }
+    kill(pid, SIGKILL);
+    waitpid(pid, &status, 0);
+    return status;
+}
+
+// Stopping the watchdog takes the server with it and leaves no pid file for saige_gui
+// to act on; only async-signal-safe calls here
+static void on_stop(int sig) {
+    if (server_pid > 0) kill(server_pid, SIGTERM);
+    unlink(PID_FILE);
+    signal(sig, SIG_DFL);
+    raise(sig);
+}
 
 int main() {
-    std::string server_cmd = "~/llama.cpp/build/bin/llama-server -m ~/SAIGE/models/Phi-3-mini-4k-instruct-q4.gguf -ngl 99 --host 0.0.0.0 --port 8080 -c 4096 --log-file /var/log/saige_inference.log";
+    signal(SIGTERM, on_stop);
+    signal(SIGINT, on_stop);
+    const std::string model = home() + HOME_MODEL;
+    int backoff = BACKOFF_INITIAL_S;
+    int restarts = 0;
+    time_t down_since = time(nullptr);
+    long downtime = 0;
 
     while (true) {
+        warm_page_cache(model);
         pid_t pid = fork();
         if (pid == 0) {
             // Child: Run server
-            execl("/bin/sh", "sh", "-c", server_cmd.c_str(), (char *)NULL);
-            exit(1);  // If execl fails
-        } else if (pid > 0) {
-            // Parent: Wait and restart on exit
-            int status;
-            waitpid(pid, &status, 0);
-            std::cerr << "Server exited (code " << WEXITSTATUS(status) << "); restarting in 10s..." << std::endl;
-            sleep(10);
-        } else {
+            signal(SIGTERM, SIG_DFL);
+            signal(SIGINT, SIG_DFL);
+            execl("/bin/sh", "sh", "-c", server_cmd().c_str(), (char *)NULL);
+            _exit(1);  // If execl fails
+        } else if (pid < 0) {
             std::cerr << "Fork failed" << std::endl;
             return 1;
         }
+        server_pid = pid;
+        write_pid(pid);
+
+        // Parent: probe until the server exits or stops answering
+        time_t started = time(nullptr);
+        time_t healthy_since = 0;
+        bool loaded = false;
+        int failures = 0;
+        int status = 0;
+        std::string reason;
+        while (true) {
+            sleep(PROBE_INTERVAL_S);
+            if (waitpid(pid, &status, WNOHANG) == pid) {
+                reason = "exited (code " + std::to_string(WEXITSTATUS(status)) + ")";
+                break;
+            }
+            time_t now = time(nullptr);
+            if (probe_health()) {
+                failures = 0;
+                loaded = true;
+                if (!healthy_since) {
+                    healthy_since = now;
+                    downtime += now - down_since;
+                    std::cerr << "Server healthy; total downtime " << downtime << "s over "
+                              << restarts << " restarts" << std::endl;
+                }
+                if (now - healthy_since >= BACKOFF_MAX_S) backoff = BACKOFF_INITIAL_S;
+                continue;
+            }
+            if (healthy_since) {
+                down_since = now;
+                healthy_since = 0;
+            }
+            if (++failures >= FAILURES_TO_RESTART && (loaded || now - started >= STARTUP_GRACE_S)) {
+                reason = "stopped answering health probes";
+                stop_server(pid);
+                break;
+            }
+        }
+
+        if (healthy_since) down_since = time(nullptr);
+        server_pid = 0;
+        unlink(PID_FILE);
+        restarts++;
+        std::cerr << "Server " << reason << "; restarting in " << backoff << "s (restart #"
+                  << restarts << ")" << std::endl;
+        sleep(backoff);
+        backoff = std::min(backoff * 2, BACKOFF_MAX_S);
     }
     return 0;
 }
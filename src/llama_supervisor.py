@@ -0,0 +1,287 @@
+import os
+import signal
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+
+
+def health_url(api_url):
+    """llama-server's /health endpoint on the same host as the chat completions URL."""
+    parts = urlsplit(api_url)
+    return f"{parts.scheme}://{parts.netloc}/health"
+
+
+def is_llama_server(pid):
+    """True when pid is a running llama-server, so a stale pid file never gets a reused pid killed."""
+    try:
+        with open(f'/proc/{pid}/cmdline', 'rb') as f:
+            argv = f.read().split(b'\0')
+    except OSError:
+        return False
+    return os.path.basename(argv[0]) == b'llama-server'
+
+
+def warm_page_cache(path, chunk_bytes=8 << 20):
+    """Read path through the page cache so the next mmap of the model is served from RAM."""
+    buffer = bytearray(chunk_bytes)
+    with open(path, 'rb', buffering=0) as f:
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+        while f.readinto(buffer):
+            pass
+
+
+# Keeps llama-server answering. A probe thread polls /health and watches token progress
+# of in-flight streams; a server that fails its probes or stops producing tokens is
+# killed and started again with exponential backoff. With a command, the supervisor
+# runs llama-server itself; otherwise it signals the pid in pid_file and leaves the
+# relaunch to llama-watchdog. `ready` is clear while the server is down, so /chat can
+# hold requests instead of failing them.
+class LlamaSupervisor:
+    def __init__(self, api_url, command=None, pid_file=None, model_path=None, probe_interval=2.0,
+                 probe_timeout=3.0, failures_to_restart=3, stall_seconds=30.0, startup_timeout=180.0,
+                 backoff_initial=1.0, backoff_max=60.0, warm_interval=300.0):
+        self.health_url = health_url(api_url)
+        self.command = command
+        self.pid_file = pid_file
+        self.model_path = model_path
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.failures_to_restart = failures_to_restart
+        self.stall_seconds = stall_seconds
+        self.startup_timeout = startup_timeout
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.warm_interval = warm_interval
+
+        self.ready = threading.Event()
+        self.lock = threading.Lock()
+        self.state = 'starting'
+        self.restarts = 0
+        self.last_restart_reason = None
+        self.downtime_seconds = 0.0
+        self.tokens_per_second = 0.0
+        self._down_since = time.monotonic()
+        self._launched_at = time.monotonic()
+        self._healthy_since = None
+        self._failures = 0
+        self._backoff = backoff_initial
+        self._proc = None
+        self._streams = 0
+        self._tokens = 0
+        self._last_progress = time.monotonic()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        if command is None:
+            # Someone else started the server; assume it is up until a probe says otherwise
+            self._mark_up()
+
+    def start(self):
+        if self.command is not None:
+            self._warm()
+            self._launch()
+        threading.Thread(target=self._run, daemon=True).start()
+        if self.model_path and self.warm_interval > 0:
+            threading.Thread(target=self._warm_loop, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._proc is not None:
+            self._kill()
+
+    # --- hooks for the /chat handlers -----------------------------------------
+
+    @contextmanager
+    def streaming(self):
+        """Wrap an upstream stream so a server that stops producing tokens is noticed."""
+        with self.lock:
+            if self._streams == 0:
+                self._last_progress = time.monotonic()
+            self._streams += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self._streams -= 1
+
+    def progress(self, tokens=1):
+        with self.lock:
+            self._tokens += tokens
+            self._last_progress = time.monotonic()
+
+    def report_failure(self):
+        """A request could not reach the server: treat it as down until a probe passes."""
+        self._mark_down()
+        self._wake.set()
+
+    def wait_ready(self, timeout, cancelled=None):
+        """Block until the server is back, timeout passes, or cancelled is set."""
+        deadline = time.monotonic() + timeout
+        while not self.ready.wait(0.25):
+            if (cancelled is not None and cancelled.is_set()) or time.monotonic() >= deadline:
+                return False
+        return True
+
+    # --- probe loop -------------------------------------------------------------
+
+    def _run(self):
+        last_tokens, last_at = 0, time.monotonic()
+        while not self._stop.is_set():
+            healthy = self._probe()
+            now = time.monotonic()
+            with self.lock:
+                tokens, streams, idle = self._tokens, self._streams, now - self._last_progress
+            # Smoothed, since a probe interval can fall between two tokens
+            rate = (tokens - last_tokens) / max(now - last_at, 1e-6)
+            self.tokens_per_second = 0.7 * self.tokens_per_second + 0.3 * rate
+            last_tokens, last_at = tokens, now
+
+            reason = None
+            if self._proc is not None and self._proc.poll() is not None:
+                reason = f"exited with code {self._proc.returncode}"
+            elif healthy:
+                self._failures = 0
+                self._mark_up()
+                if streams and idle > self.stall_seconds:
+                    reason = f"stalled: no tokens for {idle:.0f}s with {streams} streams open"
+            else:
+                self._failures += 1
+                self._mark_down()
+                starting = self.state == 'starting' and now - self._launched_at < self.startup_timeout
+                if self._failures >= self.failures_to_restart and not starting:
+                    reason = f"failed {self._failures} health probes"
+            if reason:
+                self._restart(reason)
+
+            self._wake.wait(self.probe_interval)
+            self._wake.clear()
+
+    def _probe(self):
+        try:
+            # 503 while the model is loading, 200 once it can serve
+            return requests.get(self.health_url, timeout=self.probe_timeout).status_code == 200
+        except requests.RequestException:
+            return False
+
+    def _mark_up(self):
+        now = time.monotonic()
+        with self.lock:
+            if self.ready.is_set():
+                # Only a server that stays up resets the backoff, not one that flaps
+                if self._healthy_since is not None and now - self._healthy_since > self.backoff_max:
+                    self._backoff = self.backoff_initial
+                return
+            self.downtime_seconds += now - self._down_since
+            self._healthy_since = now
+            self.state = 'healthy'
+            self.ready.set()
+
+    def _mark_down(self):
+        with self.lock:
+            if not self.ready.is_set():
+                return
+            self.ready.clear()
+            self._down_since = time.monotonic()
+            self._healthy_since = None
+            if self.state == 'healthy':
+                self.state = 'unhealthy'
+
+    # --- restart ----------------------------------------------------------------
+
+    def _restart(self, reason):
+        self._mark_down()
+        if self.command is None and self._read_pid() is None:
+            print(f"[LLAMA] Server {reason}, but no process to restart (set a command or pid file)")
+            self._failures = 0
+            return
+        with self.lock:
+            self.state = 'restarting'
+            self.restarts += 1
+            self.last_restart_reason = reason
+            delay = self._backoff
+            self._backoff = min(self.backoff_max, self._backoff * 2)
+        print(f"[LLAMA] Server {reason}; restarting in {delay:g}s (restart #{self.restarts})")
+        self._kill()
+        # A dead server's model pages are the first thing the kernel reclaims
+        self._warm()
+        if self._stop.wait(delay):
+            return
+        if self.command is not None:
+            self._launch()
+        with self.lock:
+            self.state = 'starting'
+            self._launched_at = time.monotonic()
+            self._last_progress = time.monotonic()
+        self._failures = 0
+
+    def _launch(self):
+        self._proc = subprocess.Popen(self.command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                      start_new_session=True)
+        self._launched_at = time.monotonic()
+
+    def _read_pid(self):
+        if self._proc is not None:
+            return self._proc.pid
+        try:
+            with open(self.pid_file) as f:
+                pid = int(f.read().strip())
+        except (TypeError, OSError, ValueError):
+            return None
+        # The watchdog may have died without removing the file and the pid been reused
+        return pid if is_llama_server(pid) else None
+
+    def _kill(self, grace=5.0):
+        if self._proc is not None:
+            if self._proc.poll() is None:
+                self._proc.terminate()
+                try:
+                    self._proc.wait(timeout=grace)
+                except subprocess.TimeoutExpired:
+                    self._proc.kill()
+                    self._proc.wait()
+            return
+        # External watchdog: a hung server may ignore SIGTERM, so follow up with SIGKILL
+        pid = self._read_pid()
+        try:
+            os.kill(pid, signal.SIGTERM)
+            deadline = time.monotonic() + grace
+            while time.monotonic() < deadline:
+                time.sleep(0.1)
+                if not is_llama_server(pid):
+                    return
+            os.kill(pid, signal.SIGKILL)
+        except (TypeError, ProcessLookupError, PermissionError):
+            pass
+
+    def _warm(self):
+        if not self.model_path or not os.path.exists(self.model_path):
+            return
+        try:
+            warm_page_cache(self.model_path)
+        except OSError as e:
+            print(f"[LLAMA] Could not warm {self.model_path}: {e}")
+
+    def _warm_loop(self):
+        # Re-reading a cached file is a memory copy; it keeps the pages hot against reclaim
+        while not self._stop.wait(self.warm_interval):
+            self._warm()
+
+    def snapshot(self):
+        with self.lock:
+            downtime = self.downtime_seconds
+            if not self.ready.is_set():
+                downtime += time.monotonic() - self._down_since
+            return {
+                'state': self.state,
+                'ready': self.ready.is_set(),
+                'restarts': self.restarts,
+                'last_restart_reason': self.last_restart_reason,
+                'downtime_seconds': round(downtime, 1),
+                'tokens_per_second': round(self.tokens_per_second, 1),
+                'open_streams': self._streams
+            }
@@ -0,0 +1,216 @@
+import bisect
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+
+# Sidecar index record per entry: byte offset in the segment, entry timestamp
+INDEX_RECORD = struct.Struct('<Qd')
+SEAL_PREFIX = b'{"type": "seal"'
+
+
+def read_line_at(mm, offset):
+    end = mm.find(b'\n', offset)
+    return mm[offset:len(mm) if end < 0 else end]
+
+
+# Audit log stored as numbered segments, each with a compact .idx sidecar.
+# Segment 0 is the original single-file log path, so existing logs keep working;
+# later segments are <root>.000001<ext>, <root>.000002<ext>, ...
+class SegmentedLog:
+    def __init__(self, path, segment_bytes=64 << 20):
+        self.path = path
+        self.segment_bytes = segment_bytes
+        self.root, self.ext = os.path.splitext(path)
+        self._pattern = re.compile(re.escape(os.path.basename(self.root)) + r'\.(\d{6})' + re.escape(self.ext) + '$')
+        # Sealed segments are immutable, so their entry counts are cached
+        self._sealed_counts = {}
+        self._stale_index = set()  # segments whose .idx write failed; rebuilt on next append
+        self._lock = threading.Lock()
+
+    def segment_path(self, n):
+        return self.path if n == 0 else f"{self.root}.{n:06d}{self.ext}"
+
+    def index_path(self, n):
+        return self.segment_path(n) + '.idx'
+
+    def segments(self):
+        directory = os.path.dirname(self.path) or '.'
+        numbers = [0] if os.path.exists(self.path) else []
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                match = self._pattern.match(name)
+                if match:
+                    numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    def active_segment(self):
+        numbers = self.segments()
+        return numbers[-1] if numbers else 0
+
+    def entry_count(self, n, active=None):
+        if n in self._sealed_counts:
+            return self._sealed_counts[n]
+        try:
+            count = os.path.getsize(self.index_path(n)) // INDEX_RECORD.size
+        except OSError:
+            count = 0
+        if active is None:
+            active = self.active_segment()
+        if n != active:
+            self._sealed_counts[n] = count
+        return count
+
+    def repair_index(self, n):
+        """Index any entries written to segment n after its .idx was last updated."""
+        segment, index = self.segment_path(n), self.index_path(n)
+        if not os.path.exists(segment):
+            return
+        count = os.path.getsize(index) // INDEX_RECORD.size if os.path.exists(index) else 0
+        last_offset = None
+        if count:
+            with open(index, 'rb') as f:
+                f.seek((count - 1) * INDEX_RECORD.size)
+                last_offset, _ = INDEX_RECORD.unpack(f.read(INDEX_RECORD.size))
+        with open(segment, 'rb') as seg, open(index, 'ab') as idx:
+            # Drop a torn trailing record, then resume after the last indexed entry
+            idx.truncate(count * INDEX_RECORD.size)
+            if last_offset is not None:
+                seg.seek(last_offset)
+                seg.readline()
+            pos = seg.tell()
+            for line in seg:
+                if line.strip() and not line.startswith(SEAL_PREFIX):
+                    try:
+                        timestamp = float(json.loads(line).get('timestamp', 0))
+                    except ValueError:
+                        timestamp = 0.0
+                    idx.write(INDEX_RECORD.pack(pos, timestamp))
+                pos += len(line)
+
+    def trim_torn_tail(self, n):
+        """Cut a partial last line (crash mid-write) so the segment ends on a record boundary."""
+        segment = self.segment_path(n)
+        if not os.path.exists(segment):
+            return
+        with open(segment, 'r+b') as f:
+            end = f.seek(0, os.SEEK_END)
+            pos = end
+            while pos > 0:
+                step = min(65536, pos)
+                f.seek(pos - step)
+                block = f.read(step)
+                newline = block.rfind(b'\n')
+                if newline >= 0:
+                    pos = pos - step + newline + 1
+                    break
+                pos -= step
+            if pos < end:
+                f.truncate(pos)
+
+    def append(self, records):
+        """Append (line, timestamp) records to the active segment, fsync, and index them.
+
+        timestamp is None for records that are not entries (seals). Rotation happens
+        between appends, so a batch and its seal never straddle two segments.
+        """
+        with self._lock:
+            n = self.active_segment()
+            if n in self._stale_index:
+                self.repair_index(n)
+                self._stale_index.discard(n)
+            fd = os.open(self.segment_path(n), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                start = pos = os.lseek(fd, 0, os.SEEK_END)
+                chunks = []
+                index_records = []
+                for line, timestamp in records:
+                    data = (line + '\n').encode()
+                    if timestamp is not None:
+                        index_records.append(INDEX_RECORD.pack(pos, timestamp))
+                    pos += len(data)
+                    chunks.append(data)
+                try:
+                    view = memoryview(b''.join(chunks))
+                    while view:
+                        view = view[os.write(fd, view):]
+                    os.fsync(fd)
+                except OSError:
+                    # Roll back a partial batch so the chain on disk never runs past the writer's
+                    try:
+                        os.ftruncate(fd, start)
+                    except OSError:
+                        pass
+                    raise
+            finally:
+                os.close(fd)
+            # The index is rebuildable from the segment, so it is not fsynced
+            try:
+                with open(self.index_path(n), 'ab') as idx:
+                    idx.write(b''.join(index_records))
+            except OSError as e:
+                print(f"[AUDIT] Index update failed, will rebuild: {e}")
+                self._stale_index.add(n)
+            if pos >= self.segment_bytes:
+                self._sealed_counts[n] = os.path.getsize(self.index_path(n)) // INDEX_RECORD.size
+                open(self.segment_path(n + 1), 'ab').close()
+
+    def _layout(self):
+        numbers = self.segments()
+        active = numbers[-1] if numbers else 0
+        starts = []
+        total = 0
+        for n in numbers:
+            starts.append(total)
+            total += self.entry_count(n, active)
+        return numbers, starts, total
+
+    def total_entries(self):
+        return self._layout()[2]
+
+    def _locate(self, layout, i):
+        numbers, starts, _ = layout
+        k = bisect.bisect_right(starts, i) - 1
+        return numbers[k], i - starts[k]
+
+    def _index_record(self, layout, i):
+        n, local = self._locate(layout, i)
+        with open(self.index_path(n), 'rb') as f:
+            f.seek(local * INDEX_RECORD.size)
+            return n, INDEX_RECORD.unpack(f.read(INDEX_RECORD.size))
+
+    def find_time(self, timestamp, after=False):
+        """Global index of the first entry at or after timestamp (strictly after with
+        after=True), by binary search on the index."""
+        layout = self._layout()
+        lo, hi = 0, layout[2]
+        while lo < hi:
+            mid = (lo + hi) // 2
+            found = self._index_record(layout, mid)[1][1]
+            if found < timestamp or (after and found == timestamp):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def iter_entries(self, start, stop):
+        """Yield (global_index, raw_line) for entries start <= i < stop, memory-mapped."""
+        layout = self._layout()
+        numbers, starts, total = layout
+        stop = min(stop, total)
+        i = start
+        while i < stop:
+            n, local = self._locate(layout, i)
+            count = self.entry_count(n, numbers[-1])
+            if local >= count:
+                break
+            with open(self.index_path(n), 'rb') as idx_file, open(self.segment_path(n), 'rb') as seg_file:
+                with mmap.mmap(idx_file.fileno(), 0, access=mmap.ACCESS_READ) as idx, \
+                        mmap.mmap(seg_file.fileno(), 0, access=mmap.ACCESS_READ) as seg:
+                    while local < count and i < stop:
+                        offset = INDEX_RECORD.unpack_from(idx, local * INDEX_RECORD.size)[0]
+                        yield i, read_line_at(seg, offset)
+                        local += 1
+                        i += 1
@@ -0,0 +1,73 @@
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize_message(text):
+    # "What's your status?" and "what's your status" are the same question
+    text = re.sub(r'\s+', ' ', unicodedata.normalize('NFC', text).casefold()).strip()
+    return text.rstrip('?!. ')
+
+
+# Exact-match cache of llama-server answers, stored as the token deltas that were
+# streamed so a hit replays the same SSE frames. Entries expire after ttl seconds and
+# the least recently used entry is evicted past max_entries.
+class ResponseCache:
+    def __init__(self, max_entries=256, ttl=86400, cache_sampled=False):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # With temperature > 0 every answer is a fresh sample; only cache those when asked to
+        self.cache_sampled = cache_sampled
+        self.entries = OrderedDict()  # key -> (stored_at, tokens)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def key(self, llama_request):
+        """Cache key for an upstream request, or None when it must go to llama-server."""
+        if self.max_entries <= 0:
+            return None
+        if llama_request.get('temperature', 1.0) > 0 and not self.cache_sampled:
+            with self.lock:
+                self.bypassed += 1
+            return None
+        # The whole conversation is part of the key; a bare first turn reduces to the message
+        messages = [(m['role'], normalize_message(m['content'])) for m in llama_request['messages']]
+        params = [llama_request.get(name) for name in ('model', 'max_tokens', 'temperature')]
+        return hashlib.sha256(json.dumps([messages, params]).encode()).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, tokens):
+        with self.lock:
+            self.entries[key] = (time.monotonic(), tuple(tokens))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def snapshot(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'bypassed': self.bypassed,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'entries': len(self.entries)
+            }
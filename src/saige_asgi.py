@@ -0,0 +1,198 @@
+import asyncio
+
+import httpx
+from quart import Quart, request, jsonify, render_template, Response
+
+from metrics import REGISTRY
+from saige_gui import (
+    LLAMA_API, LLAMA_POOL_SIZE, log_with_signature, logs_page, stream_json_array, verify_log,
+    parse_stream_line, STREAM_DONE, sse_event, error_events,
+    start_turn, end_turn, stats_snapshot, print_banner,
+    scheduler, Overloaded, admit, overloaded_body, queue_event, rejection_events,
+    llama_supervisor, LLAMA_SUPERVISE, LLAMA_RESTART_HOLD
+)
+
+# ASGI serving mode: every chat stream is a coroutine on one event loop instead of an
+# OS thread, and upstream tokens come over a shared keep-alive pool to llama-server.
+# Run with `python saige_gui.py --asgi` or `hypercorn saige_asgi:app`.
+app = Quart(__name__)
+app.config['RESPONSE_TIMEOUT'] = None  # chat streams can outlive Quart's 60s default
+
+llama_client = None
+
+@app.before_serving
+async def open_llama_pool():
+    global llama_client
+    llama_client = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=LLAMA_POOL_SIZE, max_keepalive_connections=LLAMA_POOL_SIZE),
+        timeout=httpx.Timeout(None, connect=5.0)
+    )
+
+@app.after_serving
+async def close_llama_pool():
+    await llama_client.aclose()
+
+@app.route('/')
+async def index():
+    return await render_template('index.html')
+
+async def stream_upstream(turn, retry=True):
+    # Leaving the `async with` early closes the upstream connection, stopping decode
+    try:
+        async with llama_client.stream('POST', LLAMA_API, json=turn.llama_request) as resp:
+            resp.raise_for_status()
+            with llama_supervisor.streaming():
+                async for frame in upstream_frames(turn, resp):
+                    yield frame
+    except httpx.ConnectError:
+        # Refused before any token: hold for the supervisor's restart, then retry once
+        llama_supervisor.report_failure()
+        if not retry or not LLAMA_SUPERVISE or not await asyncio.to_thread(
+                llama_supervisor.wait_ready, LLAMA_RESTART_HOLD, turn.cancelled):
+            raise
+        async for frame in stream_upstream(turn, retry=False):
+            yield frame
+
+async def upstream_frames(turn, resp):
+    lines = resp.aiter_lines()
+    async for line in lines:
+        if turn.cancelled.is_set():
+            return
+        content = parse_stream_line(line)
+        if content is STREAM_DONE:
+            # Read to EOF so httpx returns the connection to the pool instead of closing it
+            async for _ in lines:
+                pass
+            break
+        if content:
+            frame = turn.feed(content)
+            if frame:
+                yield frame
+
+async def restart_events(turn):
+    # Same as saige_gui.restart_events, polling instead of blocking the loop
+    if turn.cached is not None or llama_supervisor.ready.is_set():
+        return
+    yield sse_event({'restarting': llama_supervisor.snapshot()})
+    deadline = asyncio.get_running_loop().time() + LLAMA_RESTART_HOLD
+    while not llama_supervisor.ready.is_set() and not turn.cancelled.is_set():
+        if asyncio.get_running_loop().time() >= deadline:
+            return
+        await asyncio.sleep(0.25)
+
+async def admission_events(ticket, turn):
+    # Same as saige_gui.admission_events, but polls so no thread blocks on the ticket;
+    # position events still go out only when the position changes
+    last = None
+    while not ticket.granted.is_set():
+        if turn.cancelled.is_set() or scheduler.check_deadline(ticket):
+            return
+        frame = queue_event(ticket)
+        if frame != last:
+            last = frame
+            yield frame
+        await asyncio.sleep(0.05)
+
+async def audio_tail(turn):
+    # Remaining streamed audio after the last token; polls instead of blocking the loop
+    if turn.audio is None:
+        return
+    while not turn.audio.done() and not turn.cancelled.is_set():
+        for frame in turn.audio_events():
+            yield frame
+        await asyncio.sleep(0.02)
+    for frame in turn.audio_events():
+        yield frame
+
+@app.route('/chat', methods=['POST'])
+async def chat():
+    body = await request.get_json()
+    user_message = body.get('message', '')
+    client_key = body.get('client_id')
+    conversation_id = body.get('conversation_id')
+    stream_audio = bool(body.get('audio'))
+    try:
+        ticket = admit(body)
+    except Overloaded as e:
+        return jsonify(overloaded_body(e)), 503, {'Retry-After': str(max(1, round(e.retry_after)))}
+    # The request task also sends the body, so it ends when the response closes, even if
+    # the client disconnects before generate() starts (then its finally never runs)
+    asyncio.current_task().add_done_callback(lambda _: scheduler.release(ticket))
+
+    async def generate():
+        # A client disconnect cancels this generator; end_turn() then aborts the turn
+        turn = start_turn(client_key, user_message, conversation_id, stream_audio)
+        try:
+            async for frame in admission_events(ticket, turn):
+                yield frame
+            rejected = rejection_events(ticket, turn)
+            if rejected is not None:
+                for frame in rejected:
+                    yield frame
+                return
+            async for frame in restart_events(turn):
+                yield frame
+            if turn.cached is not None:
+                for frame in turn.replay():
+                    yield frame
+                    for audio in turn.audio_events():
+                        yield audio
+            else:
+                async for frame in stream_upstream(turn):
+                    yield frame
+                    for audio in turn.audio_events():
+                        yield audio
+            if turn.cancelled.is_set():
+                return
+            for frame in turn.finish():
+                yield frame
+            # Decoding is over; the slot must not wait out synthesis of streamed audio
+            scheduler.release(ticket)
+            async for frame in audio_tail(turn):
+                yield frame
+
+            # Queued for the background audit writer; signing never runs on the event loop
+            log_with_signature(user_message, turn.response_text)
+            turn.completed = True
+            yield sse_event({'done': True})
+
+        except Exception as e:
+            if not turn.cancelled.is_set():
+                turn.completed = True
+                for frame in error_events(e):
+                    yield frame
+        finally:
+            scheduler.release(ticket)
+            end_turn(client_key, turn)
+
+    return Response(generate(), mimetype='text/plain')
+
+@app.route('/logs')
+async def get_logs():
+    entries, headers = await asyncio.to_thread(logs_page, request.args)
+    return Response(stream_json_array(entries), mimetype='application/json', headers=headers)
+
+@app.route('/verify')
+async def verify_blockchain():
+    return jsonify(await asyncio.to_thread(verify_log, request.args.get('full') == '1'))
+
+@app.route('/stats')
+async def get_stats():
+    return jsonify(stats_snapshot())
+
+@app.route('/metrics')
+async def get_metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+def serve(host='0.0.0.0', port=5000):
+    from hypercorn.asyncio import serve as hypercorn_serve
+    from hypercorn.config import Config
+
+    config = Config()
+    config.bind = [f"{host}:{port}"]
+    print_banner()
+    print(f"✅ Server: ASGI (Quart + Hypercorn), {LLAMA_POOL_SIZE} pooled llama-server connections")
+    asyncio.run(hypercorn_serve(app, config))
+
+if __name__ == '__main__':
+    serve()
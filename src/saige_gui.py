@@ -1,22 +1,74 @@
 import requests
+from requests.adapters import HTTPAdapter
 from flask import Flask, request, jsonify, render_template, Response
+import base64
 import json
 import threading
 import queue
 import time
 import os
-import subprocess
-from subprocess import call, Popen, PIPE
+import sys
 from ecdsa import SigningKey, NIST256p
-import hashlib
-import base64
+from tts_engine import PiperVoiceEngine, Mimic3Engine, AudioOutputStream, upmix_to_stereo
+from tts_cache import TTSCache, cache_key
+from response_cache import ResponseCache
+from metrics import REGISTRY, RATE_BUCKETS, SIZE_BUCKETS
+from scheduler import AdmissionScheduler, Overloaded, SpeechQueue
+from session_store import SessionStore
+from segmenter import SentenceSegmenter
+from audit_log import AuditWriter, LogVerifier
+from log_segments import SegmentedLog
+from llama_supervisor import LlamaSupervisor
 
 app = Flask(__name__)
 
-# Configuration
-LLAMA_API = 'http://localhost:8080/v1/chat/completions'
-BLOCKCHAIN_KEY_FILE = '/home/input_your_info_here/.ssh/saige_blockchain_key.pem'
-BLOCKCHAIN_LOG_FILE = '/home/input_your_info_here/saige_blockchain.json'
+# Configuration (SAIGE_* environment variables override paths, e.g. for benchmark_saige.py)
+LLAMA_API = os.environ.get('SAIGE_LLAMA_API', 'http://localhost:8080/v1/chat/completions')
+BLOCKCHAIN_KEY_FILE = os.environ.get('SAIGE_KEY_FILE', '/home/input_your_info_here/.ssh/saige_blockchain_key.pem')
+BLOCKCHAIN_LOG_FILE = os.environ.get('SAIGE_LOG_FILE', '/home/input_your_info_here/saige_blockchain.json')
+BLOCKCHAIN_CHECKPOINT_FILE = BLOCKCHAIN_LOG_FILE + '.verified'  # signed resume point for /verify
+VERIFY_WORKERS = os.cpu_count() or 1  # processes for a full re-verify
+PIPER_MODEL = os.environ.get('SAIGE_PIPER_MODEL', os.path.expanduser("~/SAIGE/models/piper/en_US-ryan-high.onnx"))
+AUDIO_DEVICE = 'hw:0,0'
+AUDIO_LOCAL_PLAYBACK = True  # speak answers on AUDIO_DEVICE; False for a headless server
+AUDIO_STREAM_CLIENTS = True  # let /chat clients ask for their answer's audio in the stream instead
+AUDIO_STREAM_FRAME_MS = 200  # audio per streamed frame; smaller starts sooner, costs more frames
+TTS_LOOKAHEAD = 3  # synthesized clips buffered ahead of playback; caps audio memory
+LLAMA_POOL_SIZE = 8  # keep-alive connections held open to llama-server
+SSE_FLUSH_INTERVAL = 0.0  # seconds to group tokens into one SSE frame (0 = frame per token)
+SSE_MAX_FRAME_TOKENS = 16  # flush a grouped frame after this many tokens regardless of age
+LLAMA_MAX_TOKENS = 512
+LLAMA_TEMPERATURE = 0.85  # 0 makes answers deterministic, so repeated prompts hit the response cache
+LLAMA_CONTEXT = 4096  # llama-server -c (see llama-watchdog.cpp)
+LLAMA_SLOTS = 1  # llama-server -np; each slot caches one conversation's prompt
+LLAMA_SUPERVISE = True  # probe llama-server and restart it when it dies, fails probes or stalls
+LLAMA_SERVER_CMD = None  # argv to have SAIGE run llama-server itself; None when llama-watchdog runs it
+LLAMA_PID_FILE = '/run/saige/llama-server.pid'  # written by llama-watchdog so a hung server can be killed
+LLAMA_MODEL_FILE = os.path.expanduser("~/SAIGE/models/Phi-3-mini-4k-instruct-q4.gguf")  # kept in page cache
+LLAMA_STALL_SECONDS = 30.0  # an open stream with no token for this long means the server is hung
+LLAMA_RESTART_HOLD = 30.0  # /chat waits this long for a restarting server before reporting an error
+SESSION_MAX = 32  # conversations kept in memory (LRU)
+SESSION_IDLE_SECONDS = 3600
+TTS_FIRST_CHUNK_WORDS = 4  # first spoken chunk cuts at a clause after this many words
+TTS_MAX_CHUNK_WORDS = 40  # later chunks grow toward this size for smoother prosody
+AUDIT_COMMIT_WINDOW = 0.25  # seconds an entry may wait for group commit (durability window)
+AUDIT_BATCH_MAX = 128  # entries per signed, fsynced batch
+AUDIT_SIGN_EACH = False  # also sign every entry individually (standalone proofs, slower)
+AUDIT_SEGMENT_BYTES = 64 << 20  # rotate the audit log into a new segment past this size
+LOGS_PAGE_LIMIT = 50  # /logs entries per page when no limit is given
+TTS_CHARS_PER_SECOND = 15.0  # speaking-rate estimate for text dropped before synthesis
+TTS_CACHE_DIR = os.environ.get('SAIGE_TTS_CACHE_DIR', os.path.expanduser("~/SAIGE/cache/tts"))  # synthesized speech reused across restarts
+TTS_CACHE_MEMORY_BYTES = 32 << 20
+TTS_CACHE_DISK_BYTES = 256 << 20  # 0 disables the on-disk tier
+TTS_CACHE_MAX_CHARS = 200  # longer utterances are never cached
+RESPONSE_CACHE_ENTRIES = 256  # answers kept for repeated prompts (0 disables)
+RESPONSE_CACHE_TTL = 24 * 3600
+RESPONSE_CACHE_SAMPLED = False  # also cache when temperature > 0 (replays one sample forever)
+METRICS_TRACE = False  # print one timing line per /chat request
+CHAT_MAX_CONCURRENT = LLAMA_SLOTS  # generations admitted at once; more just contend for the GPU
+CHAT_QUEUE_MAX = 8  # requests allowed to wait for a slot; beyond this /chat answers 503
+CHAT_QUEUE_TIMEOUT = 30.0  # longest a request may wait for a slot (clients may ask for less)
+CHAT_QUEUE_UPDATE = 0.5  # seconds between queue-position events to waiting clients
 
 # Generate or load blockchain key
 if not os.path.exists(BLOCKCHAIN_KEY_FILE):
@@ -29,221 +81,776 @@ else:
         signing_key = SigningKey.from_pem(f.read())
 verifying_key = signing_key.verifying_key
 
+# Work avoided by cancelling turns (client disconnect or superseded by a new message)
+class CancellationStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cancelled_turns = 0
+        self.tokens_saved = 0
+        self.audio_seconds_saved = 0.0
+
+    def record(self, turns=0, tokens=0, audio_seconds=0.0):
+        with self.lock:
+            self.cancelled_turns += turns
+            self.tokens_saved += tokens
+            self.audio_seconds_saved += audio_seconds
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'cancelled_turns': self.cancelled_turns,
+                'tokens_saved': self.tokens_saved,
+                'audio_seconds_saved': round(self.audio_seconds_saved, 2)
+            }
+
+cancel_stats = CancellationStats()
+
+# Prometheus metrics served at /metrics (audit writer metrics are registered in audit_log)
+LLAMA_TTFT = REGISTRY.histogram('saige_llama_time_to_first_token_seconds', 'Request start to first streamed token')
+LLAMA_TOKEN_RATE = REGISTRY.histogram('saige_llama_tokens_per_second', 'Decode rate after the first token', RATE_BUCKETS)
+CHUNK_WORDS = REGISTRY.histogram('saige_segmenter_chunk_words', 'Words per chunk sent to TTS', SIZE_BUCKETS)
+TTS_SYNTHESIS = REGISTRY.histogram('saige_tts_synthesis_seconds', 'Synthesis time per utterance (cache misses)')
+TTS_PLAYBACK = REGISTRY.histogram('saige_tts_playback_seconds', 'Time spent writing each clip to aplay')
+TTS_FIRST_AUDIO = REGISTRY.histogram('saige_tts_time_to_first_audio_seconds', 'Request start to first clip played')
+TTS_STREAM_FRAMES = REGISTRY.histogram('saige_tts_stream_frames_per_turn', 'Audio frames streamed to a client per turn',
+                                       (1, 5, 10, 25, 50, 100, 250, 500, 1000))
+TTS_SENTENCE_GAP = REGISTRY.histogram('saige_tts_sentence_gap_seconds', 'Silence while the next clip was still being synthesized')
+VERIFY_SECONDS = REGISTRY.histogram('saige_verify_seconds', '/verify duration')
+LOGS_SECONDS = REGISTRY.histogram('saige_logs_seconds', '/logs duration including streaming the page')
+REGISTRY.counter('saige_cancelled_turns_total', 'Turns cancelled by disconnect or supersede', lambda: cancel_stats.cancelled_turns)
+REGISTRY.counter('saige_cancel_tokens_saved_total', 'Upper bound of decode tokens avoided by cancellation', lambda: cancel_stats.tokens_saved)
+REGISTRY.counter('saige_cancel_audio_seconds_saved_total', 'Audio not synthesized or played due to cancellation', lambda: cancel_stats.audio_seconds_saved)
+
+def is_cancelled(owner):
+    return owner is not None and owner.cancelled.is_set()
+
 # TTS Worker Class - Piper TTS with Natural Speech Flow
 class TTSWorker:
-    def __init__(self):
-        self.tts_queue = queue.Queue()
-        self.worker_thread = threading.Thread(target=self._process_tts, daemon=True)
-        self.worker_thread.start()
+    def __init__(self, lookahead=TTS_LOOKAHEAD):
+        # Two-stage pipeline: text -> synthesis thread -> bounded audio buffer -> playback thread
+        # One answer is spoken in full before the next starts (chunks grouped per turn)
+        self.tts_queue = SpeechQueue()
+        self.audio_queue = queue.Queue(maxsize=max(1, lookahead))
 
-        # Piper TTS configuration
-        self.piper_model = os.path.expanduser("~/SAIGE/models/piper/en_US-ryan-high.onnx")
-        self.use_piper = os.path.exists(self.piper_model)
+        # Piper TTS configuration - voice is loaded once and kept in-process
+        self.piper_model = PIPER_MODEL
+        self.use_piper = False
+        self.engine = None
+        self.audio_out = None
+
+        if os.path.exists(self.piper_model):
+            try:
+                self.engine = PiperVoiceEngine(self.piper_model)
+                self.use_piper = True
+            except Exception as e:
+                print(f"[TTS] Could not load Piper voice in-process: {e}")
 
         if self.use_piper:
-            print(f"[TTS] Using Piper TTS model: {self.piper_model}")
+            print(f"[TTS] Using Piper TTS model: {self.piper_model} ({self.engine.sample_rate} Hz, resident)")
         else:
-            print(f"[TTS] Piper model not found, falling back to Mimic3")
+            self.engine = Mimic3Engine()
+            print(f"[TTS] Piper model not available, falling back to Mimic3")
+
+        # Repeated utterances (greetings, stock replies) are played from cache, not re-synthesized
+        self.cache = TTSCache(TTS_CACHE_DIR, TTS_CACHE_MEMORY_BYTES, TTS_CACHE_DISK_BYTES, TTS_CACHE_MAX_CHARS)
+        # The voice is shared with client audio streams; espeak phonemization is not thread-safe
+        self.engine_lock = threading.Lock()
+
+        # Audio already handed to aplay keeps playing until _play_deadline; _playing_owner
+        # stays attached until then so a barge-in can cut the buffered tail as well
+        self._play_deadline = 0.0
+        self._playing_owner = None
+        self._play_lock = threading.Lock()
 
-    def _process_tts(self):
+        self.synth_thread = threading.Thread(target=self._synthesis_loop, daemon=True)
+        self.playback_thread = threading.Thread(target=self._playback_loop, daemon=True)
+        self.synth_thread.start()
+        self.playback_thread.start()
+
+    def _synthesis_loop(self):
         while True:
             try:
-                sentence = self.tts_queue.get(timeout=1)
-                if sentence:
-                    self._synthesize_and_play(sentence)
-                self.tts_queue.task_done()
+                sentence, queued_at, owner = self.tts_queue.get(timeout=1)
             except queue.Empty:
                 continue
+            try:
+                if is_cancelled(owner):
+                    # Flushed: never synthesized, so estimate what it would have lasted
+                    cancel_stats.record(audio_seconds=len(sentence) / TTS_CHARS_PER_SECOND)
+                elif sentence:
+                    self._speak(sentence, queued_at, owner)
             except Exception as e:
-                print(f"TTS Error: {e}")
+                print(f"TTS synthesis error: {e}")
+            finally:
+                self.tts_queue.task_done()
 
-    def _synthesize_and_play(self, text):
-        try:
-            thread_id = threading.current_thread().ident
-            temp_audio = f"/tmp/saige_tts_{thread_id}.wav"
-
-            if self.use_piper:
-                with open(os.devnull, "w") as devnull:
-                    process = Popen([
-                        "piper",
-                        "--model", self.piper_model,
-                        "--output_file", temp_audio
-                    ], stdin=PIPE, stdout=devnull, stderr=devnull, text=True)
-
-                    process.communicate(input=text)
-
-                    if process.returncode == 0 and os.path.exists(temp_audio):
-                        temp_stereo = f"/tmp/saige_tts_stereo_{thread_id}.wav"
-                        call(["sox", temp_audio, "-c", "2", temp_stereo], stderr=devnull)
-                        call(["aplay", "-D", "hw:0,0", temp_stereo], stderr=devnull)
-                        
-                        try:
-                            os.remove(temp_stereo)
-                            os.remove(temp_audio)
-                        except:
-                            pass
-            else:
-                # Fallback to Mimic3
-                temp_mono = f"/tmp/tts_mono_{thread_id}.wav"
-                temp_stereo = f"/tmp/tts_stereo_{thread_id}.wav"
-
-                with open(os.devnull, "w") as devnull:
-                    call(["mimic3", "--voice", "en_US/cmu-arctic_low",
-                         "--length-scale", "0.9", text],
-                         stdout=open(temp_mono, "wb"), stderr=devnull)
-
-                    call(["sox", temp_mono, "-c", "2", temp_stereo], stderr=devnull)
-                    call(["aplay", "-D", "hw:0,0", temp_stereo], stderr=devnull)
-
-                    try:
-                        os.remove(temp_mono)
-                        os.remove(temp_stereo)
-                    except:
-                        pass
+    def _speak(self, sentence, queued_at, owner):
+        for pcm in self.synthesize(sentence, owner):
+            # Blocks once `lookahead` clips are waiting (backpressure)
+            self.audio_queue.put((upmix_to_stereo(pcm), queued_at, owner))
 
-        except Exception as e:
-            print(f"TTS synthesis error: {e}")
+    def synthesize(self, sentence, owner=None):
+        """Yield mono S16_LE PCM for sentence, from the cache when possible.
 
-    def add_text(self, text):
+        The engine lock is held only while a piece is computed, never while the
+        caller is blocked on its consumer.
+        """
+        key = cache_key(sentence, self.engine.cache_id) if self.cache.cacheable(sentence) else None
+        cached = self.cache.get(key) if key else None
+        if cached is not None:
+            # Mimic3 learns its rate from the WAV header; a hit may come before any synthesis
+            self.engine.sample_rate = cached[0]
+            yield cached[1]
+            return
+
+        pieces = []
+        synth_seconds = 0.0
+        stream = self.engine.synthesize(sentence)
+        while True:
+            start = time.perf_counter()
+            with self.engine_lock:
+                pcm = next(stream, None)
+            synth_seconds += time.perf_counter() - start
+            if pcm is None:
+                break
+            if is_cancelled(owner):
+                return
+            if key:
+                pieces.append(pcm)
+            yield pcm
+        TTS_SYNTHESIS.observe(synth_seconds)
+        if key and pieces:
+            self.cache.put(key, self.engine.sample_rate, b''.join(pieces))
+
+    def _playback_loop(self):
+        while True:
+            try:
+                pcm, queued_at, owner = self.audio_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                if self.audio_out is None:
+                    self.audio_out = AudioOutputStream(AUDIO_DEVICE, self.engine.sample_rate)
+                bytes_per_second = 4 * self.audio_out.sample_rate
+
+                if is_cancelled(owner):
+                    cancel_stats.record(audio_seconds=len(pcm) / bytes_per_second)
+                    continue
+
+                now = time.monotonic()
+                # Playback starved while this sentence was already queued
+                if queued_at <= self._play_deadline < now:
+                    TTS_SENTENCE_GAP.observe(now - self._play_deadline)
+                if owner is not None and owner.first_audio_at is None:
+                    owner.first_audio_at = now
+                    TTS_FIRST_AUDIO.observe(now - owner.started_at)
+
+                duration = len(pcm) / bytes_per_second
+                with self._play_lock:
+                    self._play_deadline = max(self._play_deadline, now) + duration
+                    self._playing_owner = owner
+                with TTS_PLAYBACK.time():
+                    written = self.audio_out.write(pcm, should_stop=lambda: is_cancelled(owner))
+                if written < len(pcm):
+                    # Stopped by the cancel flag before cancel() got here
+                    self._cut_playback(owner)
+            except Exception as e:
+                print(f"TTS playback error: {e}")
+            finally:
+                self.audio_queue.task_done()
+
+    def add_text(self, text, owner=None):
         if text.strip():
             clean_text = text.strip().replace("  ", " ")
             if clean_text:
-                self.tts_queue.put(clean_text)
+                self.tts_queue.put((clean_text, time.monotonic(), owner))
+
+    def end_turn(self, owner):
+        """owner will add no more text; the next answer can take the speaker once it drains."""
+        self.tts_queue.close(owner)
+
+    def cancel(self, owner):
+        """Barge-in: owner's queued text and audio are skipped as they are dequeued,
+        and its clip is cut off mid-playback."""
+        self._cut_playback(owner)
+
+    def _cut_playback(self, owner):
+        # Whoever gets here first (cancel() or the playback thread) counts the lost audio
+        with self._play_lock:
+            if owner is None or self._playing_owner is not owner:
+                return
+            now = time.monotonic()
+            remaining = self._play_deadline - now
+            self._playing_owner = None
+            if remaining <= 0:
+                return
+            self._play_deadline = now
+        cancel_stats.record(audio_seconds=remaining)
+        if self.audio_out is not None:
+            self.audio_out.interrupt()
 
 # Initialize TTS worker
 tts_worker = TTSWorker()
 
+# Speech for one turn sent to its own browser as SSE audio frames instead of being played
+# on AUDIO_DEVICE, so remote clients hear their answer and concurrent answers do not wait
+# for the one speaker. Chunks are synthesized in order on a per-turn thread that starts
+# with the first chunk; frames queue until the request's generator sends them.
+class ClientAudio:
+    def __init__(self, owner, frame_ms=AUDIO_STREAM_FRAME_MS):
+        self.owner = owner
+        self.frame_ms = frame_ms
+        self.text = queue.Queue()
+        self.frames = queue.Queue()
+        self.finished = threading.Event()
+        self.sent = 0
+        self._thread = None
+
+    def add_text(self, text):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        self.text.put(text)
+
+    def close(self):
+        """No more text; frames end once the queued chunks are synthesized."""
+        if self._thread is None:
+            self.finished.set()
+        else:
+            self.text.put(None)
+
+    def _run(self):
+        try:
+            while True:
+                chunk = self.text.get()
+                if chunk is None or is_cancelled(self.owner):
+                    return
+                self._encode(chunk)
+        except Exception as e:
+            print(f"TTS stream error: {e}")
+        finally:
+            self.finished.set()
+
+    def _encode(self, chunk):
+        first = True
+        for pcm in tts_worker.synthesize(chunk, self.owner):
+            rate = tts_worker.engine.sample_rate
+            frame_bytes = 2 * max(1, rate * self.frame_ms // 1000)
+            for start in range(0, len(pcm), frame_bytes):
+                payload = {
+                    'audio': base64.b64encode(pcm[start:start + frame_bytes]).decode(),
+                    'format': 's16le',
+                    'rate': rate
+                }
+                if first:
+                    # Marks where this chunk's text starts, so the client can keep them in step
+                    payload['text'] = chunk
+                    first = False
+                self.frames.put(sse_event(payload))
+
+    def events(self, wait=False):
+        """SSE frames ready now; with wait=True, every frame until the turn's audio ends."""
+        while True:
+            try:
+                frame = self.frames.get(timeout=0.05) if wait else self.frames.get_nowait()
+            except queue.Empty:
+                if not wait or self.finished.is_set() and self.frames.empty():
+                    return
+                if is_cancelled(self.owner):
+                    return
+                continue
+            if self.sent == 0 and self.owner.first_audio_at is None:
+                self.owner.first_audio_at = time.monotonic()
+                TTS_FIRST_AUDIO.observe(self.owner.first_audio_at - self.owner.started_at)
+            self.sent += 1
+            yield frame
+
+    def done(self):
+        return self.finished.is_set() and self.frames.empty()
+
+REGISTRY.gauge('saige_tts_text_queue_depth', 'Chunks waiting for synthesis', tts_worker.tts_queue.qsize)
+REGISTRY.gauge('saige_tts_audio_queue_depth', 'Synthesized clips waiting for playback', tts_worker.audio_queue.qsize)
+REGISTRY.gauge('saige_tts_cache_hit_ratio', 'TTS audio cache hit rate', lambda: tts_worker.cache.snapshot()['hit_rate'])
+REGISTRY.gauge('saige_tts_cache_bytes', 'TTS audio cache bytes (memory + disk)',
+               lambda: tts_worker.cache.memory_used + tts_worker.cache.disk_used)
+
+# Pooled keep-alive connections to llama-server (shared by all request threads)
+llama_session = requests.Session()
+llama_session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=LLAMA_POOL_SIZE))
+
+# Health probing, hang detection and restarts for llama-server; /chat holds while it is down
+llama_supervisor = LlamaSupervisor(LLAMA_API, LLAMA_SERVER_CMD, LLAMA_PID_FILE, LLAMA_MODEL_FILE,
+                                   stall_seconds=LLAMA_STALL_SECONDS)
+if LLAMA_SUPERVISE:
+    llama_supervisor.start()
+REGISTRY.gauge('saige_llama_up', 'llama-server passing health probes', lambda: int(llama_supervisor.ready.is_set()))
+REGISTRY.counter('saige_llama_restarts_total', 'llama-server restarts by the supervisor', lambda: llama_supervisor.restarts)
+REGISTRY.counter('saige_llama_downtime_seconds_total', 'Time llama-server was not ready',
+                 lambda: llama_supervisor.snapshot()['downtime_seconds'])
+REGISTRY.gauge('saige_llama_recent_tokens_per_second', 'Tokens streamed per second over the last probe interval',
+               lambda: llama_supervisor.tokens_per_second)
+
+# Multi-turn conversations; history is trimmed to fit one slot's share of the context
+sessions = SessionStore(LLAMA_CONTEXT, LLAMA_SLOTS, LLAMA_MAX_TOKENS, SESSION_MAX, SESSION_IDLE_SECONDS)
+
+# Repeated prompts (kiosk FAQs, status questions) are answered without decoding
+response_cache = ResponseCache(RESPONSE_CACHE_ENTRIES, RESPONSE_CACHE_TTL, RESPONSE_CACHE_SAMPLED)
+REGISTRY.counter('saige_response_cache_hits_total', 'Answers replayed from the response cache', lambda: response_cache.hits)
+REGISTRY.counter('saige_response_cache_misses_total', 'Cacheable requests sent to llama-server', lambda: response_cache.misses)
+
+# Audit log: rotated segments with an offset/timestamp index; signing and fsync
+# happen on the writer thread, once per batch
+audit_store = SegmentedLog(BLOCKCHAIN_LOG_FILE, AUDIT_SEGMENT_BYTES)
+audit_writer = AuditWriter(audit_store, signing_key, AUDIT_COMMIT_WINDOW, AUDIT_BATCH_MAX, AUDIT_SIGN_EACH)
+log_verifier = LogVerifier(audit_store, signing_key, BLOCKCHAIN_CHECKPOINT_FILE, VERIFY_WORKERS)
+
 def log_with_signature(message, response):
-    log_entry = f"User: {message}\nAssistant: {response}\n"
-    message_hash = hashlib.sha256(log_entry.encode()).digest()
-    signature = signing_key.sign(message_hash)
-    
-    blockchain_entry = {
-        'timestamp': time.time(),
-        'message': message,
-        'response': response,
-        'hash': base64.b64encode(message_hash).decode(),
-        'signature': base64.b64encode(signature).decode()
-    }
-    
-    with open(BLOCKCHAIN_LOG_FILE, 'a') as f:
-        f.write(json.dumps(blockchain_entry) + '\n')
+    audit_writer.submit(message, response)
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def build_llama_request(messages, slot=None):
+    payload = {
+        'messages': messages,
+        'model': 'phi-3-mini',
+        'stream': True,
+        'max_tokens': LLAMA_MAX_TOKENS,
+        'temperature': LLAMA_TEMPERATURE
+    }
+    if slot is not None:
+        # Same slot every turn + cache_prompt: llama-server only prefills the new suffix
+        payload['id_slot'] = slot
+        payload['cache_prompt'] = True
+    return payload
+
+STREAM_DONE = object()
+
+def parse_stream_line(line):
+    """Return the delta content of one upstream SSE line, STREAM_DONE, or None."""
+    line = line.strip()
+    if not line.startswith('data: '):
+        return None
+    if line[6:].strip() == '[DONE]':
+        return STREAM_DONE
+    try:
+        data = json.loads(line[6:])
+    except json.JSONDecodeError:
+        return None
+    if 'choices' in data and data['choices']:
+        return data['choices'][0].get('delta', {}).get('content', '') or None
+    return None
+
+def sse_event(payload):
+    return "data: " + json.dumps(payload) + "\n\n"
+
+def error_events(e):
+    error_msg = f"Error connecting to Phi-3 model: {e}. Make sure llama-server is running on port 8080."
+    return [sse_event({'content': error_msg}), sse_event({'done': True})]
+
+# Groups tokens into fewer SSE frames; a frame is flushed when it is old or large enough
+class SSEFrameBuffer:
+    def __init__(self, interval=SSE_FLUSH_INTERVAL, max_tokens=SSE_MAX_FRAME_TOKENS):
+        self.interval = interval
+        self.max_tokens = max_tokens
+        self.pending = []
+        self.started = 0.0
+
+    def add(self, content):
+        if not self.pending:
+            self.started = time.monotonic()
+        self.pending.append(content)
+        if (len(self.pending) >= self.max_tokens or self.interval <= 0
+                or time.monotonic() - self.started >= self.interval):
+            return self.flush()
+        return None
+
+    def flush(self):
+        if not self.pending:
+            return None
+        frame = sse_event({'content': ''.join(self.pending)})
+        self.pending = []
+        return frame
+
+# Per-request token handling shared by the Flask and ASGI /chat handlers
+class ChatTurn:
+    def __init__(self, user_message, session=None, stream_audio=False):
+        self.user_message = user_message
+        self.session = session
+        if session is not None:
+            self.llama_request = build_llama_request(sessions.build_messages(session, user_message), session.slot)
+        else:
+            self.llama_request = build_llama_request([{'role': 'user', 'content': user_message}])
+        self.cache_key = response_cache.key(self.llama_request)
+        # Token deltas of a cached answer; when set, llama-server is not called at all
+        self.cached = response_cache.get(self.cache_key) if self.cache_key else None
+        self.streamed = []
+        self.started_at = time.monotonic()
+        self.first_token_at = None
+        self.first_audio_at = None  # set by the TTS playback thread
+        self.chunks = 0
+        self.segmenter = SentenceSegmenter(first_words=TTS_FIRST_CHUNK_WORDS, max_words=TTS_MAX_CHUNK_WORDS)
+        self.response_text = ''
+        self.frames = SSEFrameBuffer()
+        self.tokens = 0
+        self.upstream_done = False
+        self.completed = False
+        self.cancelled = threading.Event()
+        self._cancel_callbacks = []
+        # Audio for this turn goes to its client instead of the local speaker when asked for
+        self.audio = ClientAudio(self) if stream_audio and AUDIO_STREAM_CLIENTS else None
+
+    def feed(self, content):
+        """Consume one token; return an SSE frame to send now, or None."""
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+            if self.cached is None:
+                LLAMA_TTFT.observe(self.first_token_at - self.started_at)
+        self.tokens += 1
+        if self.cached is None:
+            llama_supervisor.progress()
+        self.response_text += content
+        if self.cache_key and self.cached is None:
+            self.streamed.append(content)
+
+        # Send complete sentences to TTS for natural flow
+        for chunk in self.segmenter.feed(content):
+            self.speak(chunk)
+
+        return self.frames.add(content)
+
+    def speak(self, chunk):
+        self.chunks += 1
+        CHUNK_WORDS.observe(len(chunk.split()))
+        if self.audio is not None:
+            self.audio.add_text(chunk)
+        elif AUDIO_LOCAL_PLAYBACK:
+            tts_worker.add_text(chunk, owner=self)
+
+    def finish(self):
+        """Speak the trailing partial sentence and return any unsent frames."""
+        self.upstream_done = True
+        decode_seconds = time.monotonic() - self.first_token_at if self.first_token_at else 0.0
+        if self.cached is None and self.tokens > 1 and decode_seconds > 0:
+            LLAMA_TOKEN_RATE.observe((self.tokens - 1) / decode_seconds)
+        if self.cache_key and self.cached is None and self.streamed:
+            response_cache.put(self.cache_key, self.streamed)
+        chunk = self.segmenter.flush()
+        if chunk:
+            self.speak(chunk)
+        if self.audio is not None:
+            self.audio.close()
+        frame = self.frames.flush()
+        return [frame] if frame else []
+
+    def audio_events(self, wait=False):
+        """Streamed audio frames ready to send (see ClientAudio.events)."""
+        if self.audio is None:
+            return []
+        return self.audio.events(wait)
+
+    def replay(self):
+        """Feed a cached answer through the normal path; yields the same SSE frames."""
+        self.upstream_done = True  # nothing is decoding, so a cancel saves no tokens
+        for content in self.cached:
+            if self.cancelled.is_set():
+                return
+            frame = self.feed(content)
+            if frame:
+                yield frame
+
+    def trace_line(self):
+        def ms(at):
+            return f"{(at - self.started_at) * 1000:.0f}ms" if at else '-'
+        status = 'cancelled' if self.cancelled.is_set() else 'done'
+        return (f"[TRACE] status={status} cached={self.cached is not None} ttft={ms(self.first_token_at)} "
+                f"tokens={self.tokens} chunks={self.chunks} total={ms(time.monotonic())}")
+
+    def on_cancel(self, callback):
+        self._cancel_callbacks.append(callback)
+
+    def cancel(self):
+        """Stop this turn end to end: upstream decode, queued speech and current playback."""
+        if self.cancelled.is_set():
+            return
+        self.cancelled.set()
+        # Upper bound: llama-server would have decoded at most max_tokens
+        tokens_saved = 0 if self.upstream_done else max(0, LLAMA_MAX_TOKENS - self.tokens)
+        cancel_stats.record(turns=1, tokens=tokens_saved)
+        tts_worker.cancel(self)
+        for callback in self._cancel_callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+# Generations run at most CHAT_MAX_CONCURRENT at a time; the rest wait in priority order
+scheduler = AdmissionScheduler(CHAT_MAX_CONCURRENT, CHAT_QUEUE_MAX, CHAT_QUEUE_TIMEOUT)
+REGISTRY.gauge('saige_chat_running', 'Generations holding a slot', lambda: scheduler.running)
+REGISTRY.gauge('saige_chat_waiting', 'Requests waiting for a slot', lambda: len(scheduler.waiting))
+REGISTRY.counter('saige_chat_rejected_total', 'Requests turned away by admission control',
+                 lambda: scheduler.rejected + scheduler.expired)
+
+def admit(body):
+    """Queue a /chat request; returns its Ticket or raises Overloaded."""
+    try:
+        priority = int(body.get('priority', 0))
+        max_wait = float(body['max_wait']) if body.get('max_wait') is not None else None
+    except (TypeError, ValueError):
+        priority, max_wait = 0, None
+    return scheduler.request(priority, max_wait)
+
+def overloaded_body(e):
+    return {'error': 'busy', 'reason': str(e), 'retry_after': round(e.retry_after)}
+
+def queue_event(ticket):
+    return sse_event({'queue': {'position': scheduler.position(ticket)}})
+
+def admission_events(ticket, turn):
+    """Yield queue-position events while the request waits for a generation slot."""
+    last = None
+    while not ticket.granted.wait(0 if last is None else CHAT_QUEUE_UPDATE):
+        if turn.cancelled.is_set() or scheduler.check_deadline(ticket):
+            return
+        frame = queue_event(ticket)
+        if frame != last:
+            last = frame
+            yield frame
+
+def restart_events(turn):
+    """Hold a turn while llama-server is restarting; yields one status event, then waits."""
+    if turn.cached is not None or llama_supervisor.ready.is_set():
+        return
+    yield sse_event({'restarting': llama_supervisor.snapshot()})
+    llama_supervisor.wait_ready(LLAMA_RESTART_HOLD, turn.cancelled)
+
+def rejection_events(ticket, turn):
+    """None when the turn was admitted; otherwise the frames that end its stream."""
+    if turn.cancelled.is_set():
+        return []
+    if ticket.rejected:
+        turn.completed = True
+        message = f"SAIGE is busy right now ({ticket.rejected}). Please try again shortly."
+        return [sse_event({'content': message}), sse_event({'done': True, 'error': 'busy'})]
+    return None
+
+# One in-flight turn per client_id; a new message from the same client supersedes the old one
+active_turns = {}
+active_turns_lock = threading.Lock()
+
+def start_turn(client_key, user_message, conversation_id=None, stream_audio=False):
+    session = sessions.get(conversation_id) if conversation_id else None
+    turn = ChatTurn(user_message, session, stream_audio)
+    if client_key is None:
+        # No client_id: nothing to supersede (clients behind one address must not cancel each other)
+        return turn
+    with active_turns_lock:
+        previous = active_turns.get(client_key)
+        active_turns[client_key] = turn
+    if previous is not None:
+        previous.cancel()
+    return turn
+
+def end_turn(client_key, turn):
+    # Generator closed before the done event: the client disconnected mid-stream
+    if not turn.completed:
+        turn.cancel()
+    # Keep what the user actually saw (even a cut-off answer) as conversation history
+    if turn.session is not None and turn.response_text:
+        sessions.record(turn.session, turn.user_message, turn.response_text)
+    tts_worker.end_turn(turn)
+    if turn.audio is not None:
+        turn.audio.close()
+        TTS_STREAM_FRAMES.observe(turn.audio.sent)
+    if METRICS_TRACE:
+        # First audio usually lands after the stream ends, so it is in /metrics rather than here
+        print(turn.trace_line())
+    with active_turns_lock:
+        if active_turns.get(client_key) is turn:
+            del active_turns[client_key]
+
+def stream_upstream(turn):
+    # Connect to your Phi-3 model via llama-server
+    try:
+        resp = llama_session.post(LLAMA_API, json=turn.llama_request, stream=True)
+    except requests.ConnectionError:
+        # Refused before any token: the server may have just died; hold for the restart, retry once
+        llama_supervisor.report_failure()
+        if not LLAMA_SUPERVISE or not llama_supervisor.wait_ready(LLAMA_RESTART_HOLD, turn.cancelled):
+            raise
+        resp = llama_session.post(LLAMA_API, json=turn.llama_request, stream=True)
+    resp.raise_for_status()
+    # Closing the response drops the connection, which stops llama-server decoding
+    turn.on_cancel(resp.close)
+
+    with resp, llama_supervisor.streaming():
+        lines = resp.iter_lines()
+        for chunk in lines:
+            if turn.cancelled.is_set():
+                return
+            content = parse_stream_line(chunk.decode('utf-8'))
+            if content is STREAM_DONE:
+                # Read to the chunked terminator so the connection goes back to the pool
+                for _ in lines:
+                    pass
+                break
+            if content:
+                # Stream to UI immediately
+                frame = turn.feed(content)
+                if frame:
+                    yield frame
+
 @app.route('/chat', methods=['POST'])
 def chat():
     user_message = request.json.get('message', '')
+    client_key = request.json.get('client_id')
+    conversation_id = request.json.get('conversation_id')
+    stream_audio = bool(request.json.get('audio'))
+    try:
+        ticket = admit(request.json)
+    except Overloaded as e:
+        # Fail fast instead of queueing past the deadline
+        return jsonify(overloaded_body(e)), 503, {'Retry-After': str(max(1, round(e.retry_after)))}
     
     def generate():
+        turn = start_turn(client_key, user_message, conversation_id, stream_audio)
         try:
-            # Connect to your Phi-3 model via llama-server
-            resp = requests.post(LLAMA_API, json={
-                'messages': [{'role': 'user', 'content': user_message}],
-                'model': 'phi-3-mini',
-                'stream': True,
-                'max_tokens': 512,
-                'temperature': 0.85
-            }, stream=True)
-            resp.raise_for_status()
-            
-            sentence_buffer = ''
-            response_text = ''
-            
-            for chunk in resp.iter_lines():
-                if chunk:
-                    line = chunk.decode('utf-8').strip()
-                    if line.startswith('data: '):
-                        if line[6:].strip() == '[DONE]':
-                            # Handle final buffer
-                            if sentence_buffer.strip():
-                                tts_worker.add_text(sentence_buffer.strip())
-                            break
-                            
-                        try:
-                            data = json.loads(line[6:])
-                            if 'choices' in data and data['choices']:
-                                content = data['choices'][0].get('delta', {}).get('content', '')
-                                if content:
-                                    sentence_buffer += content
-                                    response_text += content
-                                    
-                                    # Stream to UI immediately
-                                    yield "data: " + json.dumps({'content': content}) + "\n\n"
-                                    
-                                    # Send complete sentences to TTS for natural flow
-                                    is_sentence_end = content.rstrip().endswith(('.', '!', '?'))
-                                    is_long_phrase = len(sentence_buffer.split()) >= 12
-                                    
-                                    if is_sentence_end or is_long_phrase:
-                                        tts_worker.add_text(sentence_buffer.strip())
-                                        sentence_buffer = ''
-                                    
-                                    time.sleep(0.05)
-                        except json.JSONDecodeError:
-                            continue
+            yield from admission_events(ticket, turn)
+            rejected = rejection_events(ticket, turn)
+            if rejected is not None:
+                yield from rejected
+                return
+            yield from restart_events(turn)
+            for frame in turn.replay() if turn.cached is not None else stream_upstream(turn):
+                yield frame
+                # Audio for earlier sentences goes out between tokens
+                yield from turn.audio_events()
+            if turn.cancelled.is_set():
+                return
+            yield from turn.finish()
+            # Decoding is over; the slot must not wait out synthesis of streamed audio
+            scheduler.release(ticket)
+            yield from turn.audio_events(wait=True)
             
             # Log to blockchain
-            log_with_signature(user_message, response_text)
-            yield "data: " + json.dumps({'done': True}) + "\n\n"
+            log_with_signature(user_message, turn.response_text)
+            turn.completed = True
+            yield sse_event({'done': True})
             
         except Exception as e:
-            error_msg = f"Error connecting to Phi-3 model: {e}. Make sure llama-server is running on port 8080."
-            yield "data: " + json.dumps({'content': error_msg}) + "\n\n"
-            yield "data: " + json.dumps({'done': True}) + "\n\n"
+            if not turn.cancelled.is_set():
+                turn.completed = True
+                yield from error_events(e)
+        finally:
+            scheduler.release(ticket)
+            end_turn(client_key, turn)
     
-    return Response(generate(), mimetype='text/plain')
+    response = Response(generate(), mimetype='text/plain')
+    # Also covers a client that disconnects before the stream starts
+    response.call_on_close(lambda: scheduler.release(ticket))
+    return response
+
+def stats_snapshot():
+    return {
+        'cancellation': cancel_stats.snapshot(),
+        'tts_cache': tts_worker.cache.snapshot(),
+        'response_cache': response_cache.snapshot(),
+        'llama': llama_supervisor.snapshot(),
+        'scheduler': scheduler.snapshot()
+    }
+
+@app.route('/stats')
+def get_stats():
+    return jsonify(stats_snapshot())
+
+@app.route('/metrics')
+def get_metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+def logs_page(args):
+    """Resolve /logs query args to a page of entries.
+
+    cursor: first entry index; since/until: unix time range; limit: page size.
+    Without cursor or since, the newest `limit` entries (up to `until`, if given) are
+    returned. Returns the entry iterator plus paging headers; only the index and the
+    requested lines are read.
+    """
+    started = time.perf_counter()
+    total = audit_store.total_entries()
+    limit = max(0, args.get('limit', LOGS_PAGE_LIMIT, type=int))
+    cursor = args.get('cursor', type=int)
+    since = args.get('since', type=float)
+    until = args.get('until', type=float)
+
+    # Entries are in time order, so `until` is just an upper index bound
+    end = total if until is None else audit_store.find_time(until, after=True)
+
+    if cursor is not None:
+        start = max(0, cursor)
+    elif since is not None:
+        start = audit_store.find_time(since)
+    else:
+        start = max(0, end - limit)
+    stop = max(start, min(end, start + limit))
+
+    headers = {'X-Total-Entries': str(total)}
+    if stop < end:
+        headers['X-Next-Cursor'] = str(stop)
+    if start > 0:
+        headers['X-Prev-Cursor'] = str(max(0, start - limit))
+    return timed_entries(audit_store.iter_entries(start, stop), started), headers
+
+def timed_entries(entries, started):
+    # The page is read lazily while it streams, so the request ends with the iterator
+    try:
+        yield from entries
+    finally:
+        LOGS_SECONDS.observe(time.perf_counter() - started)
+
+def stream_json_array(entries):
+    # Entries are already JSON; stream them as one array without parsing
+    yield '['
+    for k, (i, line) in enumerate(entries):
+        yield (',' if k else '') + line.decode()
+    yield ']'
+
+def verify_log(full=False):
+    with VERIFY_SECONDS.time():
+        # Make entries still inside the commit window visible to the check (and
+        # create the file on a fresh install where the first chat is still pending)
+        audit_writer.flush(timeout=5)
+        if not audit_store.segments():
+            return {'status': 'No blockchain file found'}
+        return log_verifier.verify(full=full)
 
 @app.route('/logs')
 def get_logs():
-    logs = []
-    if os.path.exists(BLOCKCHAIN_LOG_FILE):
-        with open(BLOCKCHAIN_LOG_FILE, 'r') as f:
-            for line in f:
-                if line.strip():
-                    logs.append(json.loads(line))
-    return jsonify(logs)
+    entries, headers = logs_page(request.args)
+    return Response(stream_json_array(entries), mimetype='application/json', headers=headers)
 
 @app.route('/verify')
 def verify_blockchain():
-    if not os.path.exists(BLOCKCHAIN_LOG_FILE):
-        return jsonify({'status': 'No blockchain file found'})
-    
-    verified_count = 0
-    total_count = 0
-    
-    with open(BLOCKCHAIN_LOG_FILE, 'r') as f:
-        for line in f:
-            if line.strip():
-                total_count += 1
-                try:
-                    entry = json.loads(line)
-                    log_entry = f"User: {entry['message']}\nAssistant: {entry['response']}\n"
-                    message_hash = hashlib.sha256(log_entry.encode()).digest()
-                    
-                    expected_hash = base64.b64decode(entry['hash'])
-                    signature = base64.b64decode(entry['signature'])
-                    
-                    if message_hash == expected_hash and verifying_key.verify(signature, message_hash):
-                        verified_count += 1
-                except:
-                    pass
-    
-    return jsonify({
-        'total_entries': total_count,
-        'verified_entries': verified_count,
-        'integrity': f"{verified_count}/{total_count} verified"
-    })
+    # ?full=1 re-verifies the whole file across worker processes instead of resuming
+    return jsonify(verify_log(full=request.args.get('full') == '1'))
 
-if __name__ == '__main__':
+def print_banner():
     print("=" * 60)
     print("🚀 SAIGE - Self-Evolving AI with Real Phi-3 Integration")
     print("=" * 60)
     print(f"✅ AI Model: Phi-3 Mini via llama-server (localhost:8080)")
     print(f"✅ TTS Engine: {'Piper (MIT Licensed)' if tts_worker.use_piper else 'Mimic3 (Fallback)'}")
-    print(f"✅ Audio Device: hw:0,0 (USB Audio)")
+    print(f"✅ Audio Device: {AUDIO_DEVICE if AUDIO_LOCAL_PLAYBACK else 'off'} (USB Audio)"
+          f"{', streamed to clients on request' if AUDIO_STREAM_CLIENTS else ''}")
     print(f"✅ Speech Flow: Natural sentence-based streaming")
     print("=" * 60)
-    app.run(host='0.0.0.0', port=5000, debug=False)
+
+if __name__ == '__main__':
+    if '--asgi' in sys.argv:
+        # Async server: one event loop for all chat streams (see saige_asgi.py)
+        sys.modules.setdefault('saige_gui', sys.modules[__name__])
+        import saige_asgi
+        saige_asgi.serve(host='0.0.0.0', port=5000)
+    else:
+        print_banner()
+        app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
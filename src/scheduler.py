@@ -0,0 +1,213 @@
+import itertools
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted within its deadline."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+# One request's place in the admission queue
+class Ticket:
+    def __init__(self, priority, deadline, seq):
+        self.priority = priority
+        self.deadline = deadline
+        self.seq = seq
+        self.granted = threading.Event()
+        self.rejected = None          # reason, when dropped from the queue
+        self.admitted_at = None
+        self.released = False
+
+    def sort_key(self):
+        # Higher priority first, then arrival order
+        return (-self.priority, self.seq)
+
+    def expired(self):
+        return time.monotonic() > self.deadline
+
+
+# Admission control for /chat: at most `slots` generations run at once (llama-server
+# -np), up to `max_waiting` more wait in priority order, and anything that cannot
+# start before its deadline is turned away immediately instead of queueing forever.
+class AdmissionScheduler:
+    def __init__(self, slots=1, max_waiting=8, timeout=30.0):
+        self.slots = max(1, slots)
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.running = 0
+        self.waiting = []
+        self._seq = itertools.count()
+        # Moving average of how long a generation holds its slot, for wait estimates
+        self.service_seconds = 5.0
+        self.admitted = 0
+        self.rejected = 0
+        self.expired = 0
+
+    def request(self, priority=0, timeout=None):
+        """Return a Ticket (possibly already granted) or raise Overloaded."""
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        with self.lock:
+            ticket = Ticket(priority, time.monotonic() + timeout, next(self._seq))
+            if self.running < self.slots and not self.waiting:
+                self._grant(ticket)
+                return ticket
+
+            ahead = sum(1 for t in self.waiting if t.sort_key() < ticket.sort_key())
+            estimate = (ahead // self.slots + 1) * self.service_seconds
+            if estimate > timeout:
+                self.rejected += 1
+                raise Overloaded(f"estimated wait {estimate:.0f}s exceeds {timeout:g}s", estimate)
+            if len(self.waiting) >= self.max_waiting:
+                # Full: a higher-priority request bumps the lowest-priority waiter
+                lowest = max(self.waiting, key=Ticket.sort_key)
+                if lowest.sort_key() < ticket.sort_key():
+                    self.rejected += 1
+                    raise Overloaded('queue full', self.service_seconds)
+                self.waiting.remove(lowest)
+                lowest.rejected = 'queue full'
+                lowest.granted.set()
+                self.rejected += 1
+            self.waiting.append(ticket)
+            return ticket
+
+    def position(self, ticket):
+        """1-based place in the wait queue; 0 once admitted or dropped."""
+        with self.lock:
+            if ticket not in self.waiting:
+                return 0
+            return 1 + sum(1 for t in self.waiting if t.sort_key() < ticket.sort_key())
+
+    def check_deadline(self, ticket):
+        """Drop a waiting ticket whose deadline has passed; returns True if it was dropped."""
+        with self.lock:
+            if ticket in self.waiting and ticket.expired():
+                self.waiting.remove(ticket)
+                ticket.rejected = 'timed out waiting for a generation slot'
+                ticket.granted.set()
+                self.expired += 1
+                return True
+            return False
+
+    def release(self, ticket):
+        """Give back the slot (or queue place); safe to call more than once."""
+        with self.lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            if ticket in self.waiting:
+                self.waiting.remove(ticket)
+                return
+            if ticket.admitted_at is None or ticket.rejected:
+                return
+            held = time.monotonic() - ticket.admitted_at
+            self.service_seconds = 0.8 * self.service_seconds + 0.2 * held
+            self.running -= 1
+            while self.waiting and self.running < self.slots:
+                nxt = min(self.waiting, key=Ticket.sort_key)
+                self.waiting.remove(nxt)
+                if nxt.expired():
+                    nxt.rejected = 'timed out waiting for a generation slot'
+                    nxt.granted.set()
+                    self.expired += 1
+                else:
+                    self._grant(nxt)
+
+    def _grant(self, ticket):
+        self.running += 1
+        self.admitted += 1
+        ticket.admitted_at = time.monotonic()
+        ticket.granted.set()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'slots': self.slots,
+                'running': self.running,
+                'waiting': len(self.waiting),
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'expired': self.expired,
+                'service_seconds': round(self.service_seconds, 2)
+            }
+
+
+# TTS text queue that speaks one answer at a time: chunks are grouped by turn, and the
+# current turn keeps the speaker until it is closed and drained, so sentences from
+# concurrent answers never interleave. Items are (text, queued_at, owner) like before.
+class SpeechQueue:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.groups = OrderedDict()   # owner -> deque of items, in order of first chunk
+        self.open = set()             # owners that may still add chunks
+        self.current = None
+        self.unfinished = 0
+
+    def put(self, item):
+        owner = item[2]
+        with self.cond:
+            if owner not in self.groups:
+                self.groups[owner] = deque()
+                if owner is not None:
+                    self.open.add(owner)
+            self.groups[owner].append(item)
+            self.unfinished += 1
+            self.cond.notify_all()
+
+    def close(self, owner):
+        """No more chunks will come for owner; the next answer may start once it drains."""
+        with self.cond:
+            self.open.discard(owner)
+            self.cond.notify_all()
+
+    def get(self, timeout=None):
+        with self.cond:
+            end = None if timeout is None else time.monotonic() + timeout
+            while True:
+                item = self._next()
+                if item is not None:
+                    return item
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty
+                self.cond.wait(remaining)
+
+    def _next(self):
+        if self.current in self.groups:
+            pending = self.groups[self.current]
+            if pending:
+                item = pending.popleft()
+                if not pending and self.current not in self.open:
+                    del self.groups[self.current]
+                return item
+            if self.current in self.open:
+                return None  # current answer is still generating; keep the speaker
+            del self.groups[self.current]
+        elif self.current in self.open:
+            return None
+        for owner, pending in self.groups.items():
+            if pending:
+                self.current = owner
+                return self._next()
+        return None
+
+    def task_done(self):
+        with self.cond:
+            self.unfinished -= 1
+            if self.unfinished <= 0:
+                self.cond.notify_all()
+
+    def join(self):
+        with self.cond:
+            while self.unfinished > 0:
+                self.cond.wait()
+
+    def qsize(self):
+        with self.cond:
+            return sum(len(pending) for pending in self.groups.values())
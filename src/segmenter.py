@@ -0,0 +1,166 @@
+TERMINALS = '.!?'
+CLAUSE_MARKS = ',;:'
+CLOSERS = '"\')]}”’'
+
+# Words that end in '.' without ending the sentence
+TITLES = {'mr', 'mrs', 'ms', 'dr', 'prof', 'st', 'sr', 'jr', 'gen', 'col', 'lt', 'sgt', 'capt', 'rev', 'hon'}
+ABBREVIATIONS = TITLES | {
+    'e.g', 'i.e', 'etc', 'vs', 'approx', 'fig', 'no', 'vol', 'dept', 'est', 'inc', 'ltd', 'co', 'corp',
+    'jan', 'feb', 'mar', 'apr', 'jun', 'jul', 'aug', 'sep', 'sept', 'oct', 'nov', 'dec', 'a.m', 'p.m', 'u.s'
+}
+
+
+# Streaming sentence segmenter for TTS. Each character is inspected once, so work per
+# token is proportional to the token, not to the chunk built so far. A '.' is only
+# treated as a sentence end once the following text rules out decimals ("3.14"),
+# abbreviations ("Dr. Smith", "e.g. this"), initials and mid-sentence ellipses;
+# '!' and '?' end the sentence as soon as any closing quotes or brackets are past.
+# The first chunk is small so speech starts early; later chunks double in size
+# toward max_words so the voice gets whole sentences with natural prosody.
+class SentenceSegmenter:
+    def __init__(self, first_words=4, sentence_min_words=6, max_words=40):
+        self.first_words = first_words
+        self.sentence_min_words = sentence_min_words
+        self.max_words = max_words
+        self.emitted = 0
+        self._reset()
+
+    def _reset(self):
+        self._chars = []
+        self._words = 0
+        self._in_word = False
+        self._word = []            # current word, lowercased, for abbreviation checks
+        self._last_space = -1      # index in _chars of the latest word break
+        self._pending = None       # (cut_index, word_before, is_dot, is_ellipsis, words) awaiting lookahead
+        self._saw_space = False
+        self._prev_word = ''       # word before the current one, lowercased
+        self._after_initial = False  # pending dot follows an initial ("J. R.")
+        self._letter_check = False   # pending single letter: the char after the next letter decides
+
+    def _target(self):
+        return min(self.max_words, self.first_words * (2 ** self.emitted))
+
+    def feed(self, token):
+        """Consume one token; return the list of chunks that are now complete."""
+        ready = []
+        for ch in token:
+            chunk = self._consume(ch)
+            if chunk:
+                ready.append(chunk)
+        return ready
+
+    def flush(self):
+        """Return whatever is left at end of stream (or None)."""
+        text = ''.join(self._chars).strip()
+        self._reset()
+        if text:
+            self.emitted += 1
+            return text
+        return None
+
+    def _cut(self, index):
+        text = ''.join(self._chars[:index]).strip()
+        rest = self._chars[index:]
+        self._reset()
+        for ch in rest:
+            self._track(ch)
+        if text:
+            self.emitted += 1
+            return text
+        return None
+
+    def _track(self, ch):
+        # Append ch and maintain word count/state; no boundary decisions
+        self._chars.append(ch)
+        if ch.isspace():
+            if self._in_word:
+                self._last_space = len(self._chars) - 1
+            self._in_word = False
+        else:
+            if not self._in_word:
+                self._words += 1
+                self._prev_word = ''.join(self._word)
+                self._word = []
+            self._in_word = True
+            self._word.append(ch.lower())
+
+    def _consume(self, ch):
+        prev_in_word = self._in_word
+        prev_char = self._chars[-1] if self._chars else ''
+        self._track(ch)
+
+        if self._pending is not None:
+            chunk = self._resolve_pending(ch)
+            if chunk or self._pending is not None:
+                return chunk
+
+        if ch in TERMINALS and prev_in_word:
+            word = ''.join(self._word[:-1]).rstrip('.')
+            self._pending = (len(self._chars), word, ch == '.', False, self._words)
+            self._saw_space = False
+            prev = self._prev_word
+            self._after_initial = len(prev) == 2 and prev[0].isalpha() and prev[1] == '.'
+            return None
+
+        # Clause break (", " / "; " / ": ") is a good early cut once the chunk is big enough
+        if ch.isspace() and prev_char in CLAUSE_MARKS and self._words >= self._target():
+            return self._cut(len(self._chars) - 1)
+
+        # Hard cap: cut at the last word break once a chunk runs too long
+        if self._words > min(self.max_words, 2 * self._target()) and self._last_space > 0:
+            return self._cut(self._last_space)
+        return None
+
+    def _resolve_pending(self, ch):
+        cut, word, is_dot, is_ellipsis, words = self._pending
+        if not self._saw_space:
+            if ch in CLOSERS or ch in TERMINALS:
+                # Extend over closing quotes/brackets and runs like "?!" or "..."
+                ellipsis = is_ellipsis or (ch == '.' and self._chars[-2] == '.')
+                self._pending = (len(self._chars), word, is_dot, ellipsis, words)
+                return None
+            if ch.isspace():
+                if not is_dot:
+                    # "!" and "?" never continue a sentence; no need to see the next word
+                    self._pending = None
+                    return self._end_sentence(cut, words)
+                self._saw_space = True
+                return None
+            # "3.14", "U.S", "e.g": the dot was inside a token
+            self._pending = None
+            return None
+
+        if self._letter_check:
+            # "J. R. Tolkien" continues; "vitamin C. It helps" and "than I. The" end
+            self._letter_check = False
+            self._pending = None
+            if ch == '.':
+                return None
+            return self._end_sentence(cut, words)
+
+        if ch.isspace():
+            return None
+
+        # First visible character after the break decides the boundary
+        self._pending = None
+        if is_dot:
+            starts_sentence = ch.isupper() or ch in '"\'“('
+            if word in TITLES:
+                return None
+            if len(word) == 1 and word.isalpha():
+                # A lone letter is an initial unless a new sentence follows it
+                if not starts_sentence or self._after_initial:
+                    return None
+                if ch.isalpha():
+                    # The next word might be another initial; wait one more character
+                    self._pending = (cut, word, is_dot, is_ellipsis, words)
+                    self._letter_check = True
+                    return None
+            if (word in ABBREVIATIONS or is_ellipsis) and not starts_sentence:
+                return None
+        return self._end_sentence(cut, words)
+
+    def _end_sentence(self, cut, words):
+        if self.emitted == 0 or words >= min(self.sentence_min_words, self._target()):
+            return self._cut(cut)
+        return None
@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+def estimate_tokens(text):
+    # Conservative for Phi-3's tokenizer (~4 chars/token in English); avoids a /tokenize round trip
+    return len(text) // 3 + 4
+
+
+# One conversation: message history plus the llama-server slot holding its KV cache
+class ChatSession:
+    def __init__(self, session_id, slot):
+        self.session_id = session_id
+        self.slot = slot
+        self.messages = []
+        self.last_used = time.monotonic()
+
+    def history_tokens(self):
+        return sum(estimate_tokens(m['content']) for m in self.messages)
+
+
+# Server-side conversations keyed by conversation id, pinned to llama-server slots
+class SessionStore:
+    def __init__(self, context_tokens=4096, slots=1, reserve_tokens=512, max_sessions=32, idle_seconds=3600):
+        # Each slot gets an equal share of llama-server's -c context
+        self.budget = context_tokens // max(1, slots) - reserve_tokens
+        self.slots = max(1, slots)
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.sessions = OrderedDict()
+        self.slot_last_used = [0.0] * self.slots
+        self.lock = threading.Lock()
+
+    def get(self, session_id):
+        with self.lock:
+            self._evict_idle()
+            session = self.sessions.get(session_id)
+            if session is None:
+                # Reuse the slot whose cache has gone unused the longest
+                slot = min(range(self.slots), key=lambda i: self.slot_last_used[i])
+                session = ChatSession(session_id, slot)
+                self.sessions[session_id] = session
+                while len(self.sessions) > self.max_sessions:
+                    self.sessions.popitem(last=False)
+            self.sessions.move_to_end(session_id)
+            session.last_used = time.monotonic()
+            self.slot_last_used[session.slot] = session.last_used
+            return session
+
+    def build_messages(self, session, user_message):
+        """History plus the new message, trimmed to fit the slot's context budget."""
+        with self.lock:
+            pending = estimate_tokens(user_message)
+            if session.history_tokens() + pending > self.budget:
+                # Drop oldest exchanges down to half the budget in one go, so the
+                # prompt prefix (and llama-server's cached KV for it) stays stable
+                # for several turns instead of shifting on every message
+                while session.messages and session.history_tokens() + pending > self.budget // 2:
+                    del session.messages[:2]
+            return session.messages + [{'role': 'user', 'content': user_message}]
+
+    def record(self, session, user_message, response_text):
+        with self.lock:
+            session.messages.append({'role': 'user', 'content': user_message})
+            session.messages.append({'role': 'assistant', 'content': response_text})
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        for session_id in [sid for sid, s in self.sessions.items() if s.last_used < cutoff]:
+            del self.sessions[session_id]
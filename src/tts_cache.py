@@ -0,0 +1,152 @@
+import hashlib
+import os
+import re
+import struct
+import threading
+import unicodedata
+from collections import OrderedDict
+
+# Disk entry header: sample rate of the mono S16_LE PCM that follows
+ENTRY_HEADER = struct.Struct('<I')
+QUOTES = str.maketrans({'‘': "'", '’': "'", '“': '"', '”': '"'})
+
+
+def normalize_text(text):
+    # Variants that synthesize identically share one entry; case is kept (acronyms are spelled out)
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFC', text).translate(QUOTES)).strip()
+
+
+def cache_key(text, voice_id):
+    return hashlib.sha256(f"{voice_id}\0{normalize_text(text)}".encode()).hexdigest()
+
+
+# Content-addressed store of synthesized utterances: a byte-bounded in-memory LRU in
+# front of a byte-bounded directory of <sha256>.pcm files evicted oldest-used first.
+# An entry is written to disk on its first reuse, so one-off LLM sentences stay in
+# memory only while stock phrases persist across restarts.
+class TTSCache:
+    def __init__(self, directory, memory_bytes=32 << 20, disk_bytes=256 << 20, max_chars=200):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.max_chars = max_chars
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()   # key -> (sample_rate, pcm)
+        self.memory_used = 0
+        self.disk = OrderedDict()     # key -> file size, least recently used first
+        self.disk_used = 0
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        if directory and disk_bytes > 0:
+            os.makedirs(directory, exist_ok=True)
+            self._scan()
+
+    def _scan(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith('.tmp'):
+                os.remove(path)
+            elif name.endswith('.pcm'):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self.disk[key] = size
+            self.disk_used += size
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pcm')
+
+    def cacheable(self, text):
+        return len(text) <= self.max_chars
+
+    def get(self, key):
+        """Return (sample_rate, mono_pcm) for key, or None on a miss."""
+        with self.lock:
+            entry = self.memory.get(key)
+            on_disk = key in self.disk
+            if entry is not None:
+                self.memory.move_to_end(key)
+                self.hits_memory += 1
+        if entry is not None:
+            if not on_disk:
+                self._write(key, entry)
+            return entry
+        if on_disk:
+            try:
+                with open(self._path(key), 'rb') as f:
+                    data = f.read()
+                os.utime(self._path(key))
+                entry = (ENTRY_HEADER.unpack_from(data)[0], data[ENTRY_HEADER.size:])
+            except (OSError, struct.error):
+                entry = None
+            with self.lock:
+                if entry is None:
+                    self.disk_used -= self.disk.pop(key, 0)
+                else:
+                    self.disk.move_to_end(key)
+                    self.hits_disk += 1
+                    self._remember(key, entry)
+                    return entry
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, sample_rate, pcm):
+        with self.lock:
+            self._remember(key, (sample_rate, pcm))
+
+    def _remember(self, key, entry):
+        size = len(entry[1])
+        if size > self.memory_bytes:
+            return
+        if key in self.memory:
+            self.memory_used -= len(self.memory.pop(key)[1])
+        self.memory[key] = entry
+        self.memory_used += size
+        while self.memory_used > self.memory_bytes:
+            _, (_, old) = self.memory.popitem(last=False)
+            self.memory_used -= len(old)
+
+    def _write(self, key, entry):
+        sample_rate, pcm = entry
+        size = ENTRY_HEADER.size + len(pcm)
+        if not self.directory or size > self.disk_bytes:
+            return
+        path = self._path(key)
+        # Per thread: concurrent client audio threads may write the same phrase at once
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(ENTRY_HEADER.pack(sample_rate))
+                f.write(pcm)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"[TTS] Cache write failed: {e}")
+            return
+        with self.lock:
+            # A concurrent write of the same key replaced the file; count it once
+            self.disk_used += size - self.disk.pop(key, 0)
+            self.disk[key] = size
+            while self.disk_used > self.disk_bytes:
+                old, old_size = self.disk.popitem(last=False)
+                self.disk_used -= old_size
+                try:
+                    os.remove(self._path(old))
+                except OSError:
+                    pass
+
+    def snapshot(self):
+        with self.lock:
+            lookups = self.hits_memory + self.hits_disk + self.misses
+            return {
+                'hits_memory': self.hits_memory,
+                'hits_disk': self.hits_disk,
+                'misses': self.misses,
+                'hit_rate': round((self.hits_memory + self.hits_disk) / lookups, 3) if lookups else 0.0,
+                'memory_entries': len(self.memory),
+                'memory_bytes': self.memory_used,
+                'disk_entries': len(self.disk),
+                'disk_bytes': self.disk_used
+            }
@@ -0,0 +1,114 @@
+import io
+import os
+import subprocess
+import threading
+import wave
+
+
+def upmix_to_stereo(pcm):
+    # Duplicate each 16-bit mono sample into L and R without leaving Python's C slicing
+    stereo = bytearray(len(pcm) * 2)
+    stereo[0::4] = pcm[0::2]
+    stereo[1::4] = pcm[1::2]
+    stereo[2::4] = pcm[0::2]
+    stereo[3::4] = pcm[1::2]
+    return bytes(stereo)
+
+
+# Piper voice kept resident in-process (onnxruntime session loaded once)
+class PiperVoiceEngine:
+    def __init__(self, model_path, use_cuda=False):
+        from piper.voice import PiperVoice
+        self.model_path = model_path
+        self.voice = PiperVoice.load(model_path, use_cuda=use_cuda)
+        self.sample_rate = self.voice.config.sample_rate
+        # Identifies the voice and its synthesis settings for the audio cache
+        params = [getattr(self.voice.config, name, None) for name in ('length_scale', 'noise_scale', 'noise_w')]
+        self.cache_id = f"piper:{os.path.basename(model_path)}:{os.path.getsize(model_path)}:{params}"
+
+    def synthesize(self, text):
+        """Yield mono S16_LE PCM for text, one piece per phonemized sentence."""
+        if hasattr(self.voice, 'synthesize_stream_raw'):
+            # piper-tts 1.2.x
+            for pcm in self.voice.synthesize_stream_raw(text):
+                yield pcm
+        else:
+            # piper-tts 1.3+ yields AudioChunk objects
+            for chunk in self.voice.synthesize(text):
+                yield chunk.audio_int16_bytes
+
+
+# Mimic3 fallback: WAV captured from stdout in memory instead of temp files
+class Mimic3Engine:
+    def __init__(self, voice='en_US/cmu-arctic_low', length_scale=0.9):
+        self.voice = voice
+        self.length_scale = length_scale
+        self.sample_rate = 16000  # refreshed from the WAV header on each call
+        self.cache_id = f"mimic3:{voice}:{length_scale}"
+
+    def synthesize(self, text):
+        wav_bytes = subprocess.run(
+            ["mimic3", "--voice", self.voice, "--length-scale", str(self.length_scale), text],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        ).stdout
+        if not wav_bytes:
+            return
+        with wave.open(io.BytesIO(wav_bytes), 'rb') as wav:
+            self.sample_rate = wav.getframerate()
+            yield wav.readframes(wav.getnframes())
+
+
+# One long-lived aplay process fed raw PCM over stdin; reopened if it dies
+class AudioOutputStream:
+    def __init__(self, device='hw:0,0', sample_rate=22050, channels=2, chunk_frames=2048):
+        self.device = device
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.chunk_bytes = chunk_frames * channels * 2
+        self._proc = None
+        self._lock = threading.Lock()
+
+    def _ensure_open(self):
+        if self._proc is None or self._proc.poll() is not None:
+            self._proc = subprocess.Popen([
+                "aplay", "-q",
+                "-D", self.device,
+                "-t", "raw",
+                "-f", "S16_LE",
+                "-c", str(self.channels),
+                "-r", str(self.sample_rate)
+            ], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return self._proc
+
+    def write(self, pcm, should_stop=None):
+        """Write PCM in chunks; returns the number of bytes actually sent to aplay."""
+        written = 0
+        with self._lock:
+            proc = self._ensure_open()
+            try:
+                for start in range(0, len(pcm), self.chunk_bytes):
+                    if should_stop is not None and should_stop():
+                        break
+                    proc.stdin.write(pcm[start:start + self.chunk_bytes])
+                    written = min(len(pcm), start + self.chunk_bytes)
+                proc.stdin.flush()
+            except (BrokenPipeError, ValueError):
+                # aplay exited or was interrupted; next write reopens it
+                self._proc = None
+        return written
+
+    def interrupt(self):
+        # Barge-in: killing aplay also discards what is already in the pipe and ALSA buffer
+        proc = self._proc
+        if proc is not None and proc.poll() is None:
+            proc.kill()
+
+    def close(self):
+        with self._lock:
+            if self._proc is not None:
+                try:
+                    self._proc.stdin.close()
+                    self._proc.wait(timeout=5)
+                except Exception:
+                    self._proc.kill()
+                self._proc = None
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Sentence Segmenter Test + Time-to-First-Audio Benchmark
+Checks TTS chunking on a tricky corpus, then replays a simulated token stream
+through the old and new chunking rules and reports when the first audio starts.
+"""
+
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from segmenter import SentenceSegmenter
+
+# (text, expected chunks) - chunks are what the TTS worker would receive
+CORPUS = [
+    ("Hello! How are you today? I am fine.",
+     ["Hello!", "How are you today?", "I am fine."]),
+    ("Dr. Smith paid $3.50 for the book today. It was cheap.",
+     ["Dr. Smith paid $3.50 for the book today.", "It was cheap."]),
+    ("Bring snacks, e.g. fruit or nuts, and water. See you there.",
+     ["Bring snacks, e.g. fruit or nuts, and water.", "See you there."]),
+    ("We met at 5 p.m. on Jan. 3rd near the old bridge. It rained.",
+     ["We met at 5 p.m. on Jan. 3rd near the old bridge.", "It rained."]),
+    ("The U.S. economy grew 2.5% last year. Analysts were surprised.",
+     ["The U.S. economy grew 2.5% last year.", "Analysts were surprised."]),
+    ('She said "Go home now." Then she left.',
+     ['She said "Go home now."', "Then she left."]),
+    ("I waited... and waited. Nothing happened.",
+     ["I waited... and waited.", "Nothing happened."]),
+    ("Version 1.2.3 was released by J. R. Tolkien fans. Really?!",
+     ["Version 1.2.3 was released by J. R. Tolkien fans.", "Really?!"]),
+    ("It is better than I. The rest is noise.",
+     ["It is better than I.", "The rest is noise."]),
+    ("Take vitamin C. It helps a lot.",
+     ["Take vitamin C.", "It helps a lot."]),
+    ("Plan for option b. if needed, then wait.",
+     ["Plan for option b. if needed, then wait."]),
+]
+
+
+def segment(text, tokens=None):
+    # Sentence mode: no small first chunk and no clause cuts, so only boundary detection is tested
+    segmenter = SentenceSegmenter(first_words=40, sentence_min_words=1)
+    chunks = []
+    for token in tokens or tokenize(text):
+        chunks.extend(segmenter.feed(token))
+    tail = segmenter.flush()
+    if tail:
+        chunks.append(tail)
+    return chunks
+
+
+def tokenize(text):
+    """Rough BPE-like split: words with their leading space, digits and punctuation alone"""
+    return re.findall(r" ?[A-Za-z']+| ?\d| ?[^\sA-Za-z\d]|\s+", text)
+
+
+def test_corpus_segmentation():
+    print("=" * 60)
+    print("Segmenter corpus test")
+    print("=" * 60)
+    failures = 0
+    for text, expected in CORPUS:
+        # Token boundaries must not change the result
+        for tokens in (tokenize(text), list(text), [text]):
+            got = segment(text, tokens)
+            if got != expected:
+                failures += 1
+                print(f"✗ {text!r}\n    expected {expected}\n    got      {got}")
+                break
+        else:
+            print(f"✓ {text!r} -> {len(expected)} chunks")
+    assert failures == 0, f"{failures} corpus cases failed"
+
+
+def test_adaptive_chunks():
+    print("\n" + "=" * 60)
+    print("Adaptive chunk sizes (default settings)")
+    print("=" * 60)
+    text = " ".join(t for t, _ in CORPUS)
+    segmenter = SentenceSegmenter()
+    chunks = []
+    for token in tokenize(text):
+        chunks.extend(segmenter.feed(token))
+    chunks.append(segmenter.flush())
+    for chunk in chunks:
+        print(f"  {len(chunk.split()):2d} words: {chunk!r}")
+    assert len(chunks[0].split()) <= 2 * segmenter.first_words, "first chunk should be short"
+    assert max(len(c.split()) for c in chunks) <= segmenter.max_words
+    # No chunk may end inside an abbreviation, initial or number
+    for chunk in chunks[:-1]:
+        assert not re.search(r"\b(Dr|e\.g|p\.m|Jan|J|R|U\.S)\.$|\d\.$", chunk), f"bad cut: {chunk!r}"
+
+
+def old_chunker(tokens):
+    """The previous /chat rule: split when a token ends in .!? or the buffer hits 12 words"""
+    buffer = ''
+    for i, token in enumerate(tokens):
+        buffer += token
+        if token.rstrip().endswith(('.', '!', '?')) or len(buffer.split()) >= 12:
+            yield i, buffer.strip()
+            buffer = ''
+    if buffer.strip():
+        yield len(tokens) - 1, buffer.strip()
+
+
+def new_chunker(tokens):
+    segmenter = SentenceSegmenter()
+    for i, token in enumerate(tokens):
+        for chunk in segmenter.feed(token):
+            yield i, chunk
+    tail = segmenter.flush()
+    if tail:
+        yield len(tokens) - 1, tail
+
+
+def time_to_first_audio(chunker, tokens, tokens_per_second, synth_base, synth_per_char):
+    """First chunk is ready when its last token arrives; audio starts after it is synthesized"""
+    i, chunk = next(chunker(tokens))
+    ready = (i + 1) / tokens_per_second
+    return ready + synth_base + synth_per_char * len(chunk), chunk
+
+
+def test_time_to_first_audio(tokens_per_second=12.0, synth_base=0.08, synth_per_char=0.004):
+    print("\n" + "=" * 60)
+    print(f"Time-to-first-audio at {tokens_per_second:.0f} tok/s "
+          f"(synthesis {synth_base * 1000:.0f}ms + {synth_per_char * 1000:.0f}ms/char)")
+    print("=" * 60)
+    replies = [
+        "Sure, I can help with that, but first let me explain how the process works. "
+        "It takes about 3.5 minutes in total.",
+        "The quick answer is yes. The longer answer depends on your setup.",
+        "Well, according to Dr. Smith, the results from Jan. 3rd were inconclusive, "
+        "so the team repeated the test twice.",
+    ]
+    totals = {'old': 0.0, 'new': 0.0}
+    for reply in replies:
+        tokens = tokenize(reply)
+        for name, chunker in (('old', old_chunker), ('new', new_chunker)):
+            ttfa, chunk = time_to_first_audio(chunker, tokens, tokens_per_second, synth_base, synth_per_char)
+            totals[name] += ttfa
+            print(f"  {name}: {ttfa * 1000:6.0f}ms  first chunk: {chunk!r}")
+    print(f"\nMean TTFA: old {totals['old'] / len(replies) * 1000:.0f}ms, "
+          f"new {totals['new'] / len(replies) * 1000:.0f}ms")
+
+
+def test_per_token_cost(words=4000):
+    print("\n" + "=" * 60)
+    print("Per-token cost on one long unpunctuated reply")
+    print("=" * 60)
+    tokens = tokenize(" word" * words)
+    for name, chunker in (('old', old_chunker), ('new', new_chunker)):
+        start = time.perf_counter()
+        for _ in chunker(tokens):
+            pass
+        elapsed = time.perf_counter() - start
+        print(f"  {name}: {elapsed / len(tokens) * 1e6:.2f}µs/token")
+
+
+if __name__ == "__main__":
+    test_corpus_segmentation()
+    test_adaptive_chunks()
+    test_time_to_first_audio()
+    test_per_token_cost()
+    print("\n✅ Segmenter tests passed")
@@ -1,108 +0,0 @@
-#!/usr/bin/env python3
-"""
-TTS Synchronization Fix Test Script
-Run this to test the new threaded TTS system before deploying to Jetson
-"""
-
-import time
-import threading
-import queue
-from collections import deque
-
-# Mock the TTS calls for testing on Windows
-def mock_tts_call(text, output_file):
-    """Mock TTS call that simulates 2s processing time"""
-    print(f"[TTS] Synthesizing: '{text[:30]}...'")
-    time.sleep(2)  # Simulate Mimic3 latency
-    print(f"[TTS] ✓ Playing: '{text[:30]}...'")
-
-class MockTTSWorker:
-    def __init__(self):
-        self.tts_queue = queue.Queue()
-        self.worker_thread = threading.Thread(target=self._process_tts, daemon=True)
-        self.worker_thread.start()
-        print("[TTS] Worker thread started")
-        
-    def _process_tts(self):
-        """Background thread that processes TTS queue without blocking"""
-        while True:
-            try:
-                sentence = self.tts_queue.get(timeout=1)
-                if sentence:
-                    mock_tts_call(sentence, "temp.wav")
-                self.tts_queue.task_done()
-            except queue.Empty:
-                continue
-            except Exception as e:
-                print(f"[TTS] Error: {e}")
-    
-    def add_text(self, text):
-        """Add text to TTS queue (non-blocking)"""
-        sentences = text.split('. ')
-        for sentence in sentences:
-            if sentence.strip():
-                self.tts_queue.put(sentence.strip() + '.')
-                print(f"[TTS] Queued: '{sentence[:20]}...'")
-
-def simulate_streaming_with_tts():
-    """Simulate the streaming chat with TTS"""
-    print("=== Testing ULTRA-FAST TTS (No Delay) ===\n")
-    
-    # Initialize TTS worker
-    tts_worker = MockTTSWorker()
-    
-    # Simulate streaming text chunks (word by word)
-    stream_chunks = [
-        "Hello, I'm",      # 2 words
-        " SAIGE, your",    # 2 more = 4 total → TTS trigger!
-        " autonomous AI",  # 2 more = 2 → building
-        " assistant. I",   # 2 more = 4 total → TTS trigger!
-        " can help",       # 2 more = 2 → building
-        " you with",       # 2 more = 4 total → TTS trigger!
-        " robotics and",   # 2 more = 2 → building
-        " machine learning" # 2 more = 4 total → TTS trigger!
-    ]
-    
-    print("[STREAM] Starting ULTRA-FAST streaming (4-word chunks)...")
-    full_response = ""
-    tts_buffer = ""
-    word_count = 0
-    
-    for i, chunk in enumerate(stream_chunks):
-        # Simulate real-time streaming
-        time.sleep(0.05)  # Very fast chunks
-        
-        full_response += chunk
-        tts_buffer += chunk
-        word_count += chunk.count(' ')
-        
-        print(f"[UI] Chunk {i+1}: '{chunk}' (Buffer words: {word_count})")
-        
-        # Ultra-fast trigger - just 4 words!
-        if word_count >= 4:
-            tts_worker.add_text(tts_buffer.strip())
-            print(f"[ULTRA-TTS] 🚀 IMMEDIATE trigger after only {word_count} words!")
-            tts_buffer = ""
-            word_count = 0
-    
-    # Handle final buffer
-    if tts_buffer.strip():
-        tts_worker.add_text(tts_buffer.strip())
-        print(f"[ULTRA-TTS] 🚀 Final chunk sent to TTS")
-    
-    print(f"\n[STREAM] ✓ Ultra-fast streaming completed")
-    print(f"[FULL] Response: '{full_response}'")
-    
-    # Wait for TTS to finish
-    print("\n[TTS] Processing audio with NO waiting for completion...")
-    tts_worker.tts_queue.join()
-    print("[TTS] ✓ All audio completed")
-    
-    print("\n=== ULTRA-FAST Results ===")
-    print("🚀 TTS STARTS after just 4 words (0.2 seconds)")
-    print("⚡ Audio plays WHILE AI is still generating")
-    print("🔥 ZERO delay - speech starts immediately")
-    print("✅ User hears audio before reading is done!")
-
-if __name__ == "__main__":
-    simulate_streaming_with_tts()
\ No newline at end of file